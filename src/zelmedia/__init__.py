@@ -2,7 +2,7 @@
 """
 Public re-exports so callers can simply do:
 
-    from zelmedia import scan, rename, markdown, metadata, links, paths
+    from zelmedia import scan, rename, markdown, metadata, links, paths, index, probe
 """
 from importlib import import_module as _imp
 
@@ -15,5 +15,7 @@ metadata  = _imp(f"{_core}.metadata")
 paths     = _imp(f"{_core}.paths")
 links     = _imp(f"{_core}.links")
 constants = _imp(f"{_core}.constants")
+index     = _imp(f"{_core}.index")
+probe     = _imp(f"{_core}.probe")
 
-__all__ = ["scan", "rename", "markdown", "metadata", "paths", "links", "constants"]
+__all__ = ["scan", "rename", "markdown", "metadata", "paths", "links", "constants", "index", "probe"]
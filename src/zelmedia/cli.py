@@ -6,6 +6,7 @@ from __future__ import annotations
 import os
 import json
 import logging
+import time
 from pathlib import Path
 from typing import List, Tuple
 
@@ -18,7 +19,7 @@ if not os.getenv("TMDB_API_KEY"):
     load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
 
 # ───────────────────────── internal imports ──────────────────────────
-from .core import scan, markdown, metadata, rename, links, paths
+from .core import scan, markdown, metadata, rename, links, paths, watch, probe, dupes, throttle, transfer
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -34,10 +35,31 @@ def movie() -> None:
 # ─────────────────────────── scan ────────────────────────────
 @movie.command("scan")
 @click.argument("folder", type=click.Path(exists=True, file_okay=False), default=".")
-def scan_cmd(folder: str) -> None:
+@click.option("--no-index", is_flag=True, help="Ignore the scan index and re-read every directory")
+@click.option("--format", "fmt", type=click.Choice(["json", "ndjson"]), default="json",
+              show_default=True, help="ndjson streams one compact object per line")
+@click.option("--exclude", "-x", multiple=True, metavar="PATTERN",
+              help="Gitignore-style pattern to skip (repeatable; adds to .zelignore)")
+@click.option("--probe", "with_probe", is_flag=True,
+              help="Add duration/resolution/codec read from the container header")
+@click.option("--detect", is_flag=True,
+              help="Also sniff files with unknown extensions for a video container signature")
+def scan_cmd(folder: str, no_index: bool, fmt: str, exclude: Tuple[str, ...],
+             with_probe: bool, detect: bool) -> None:
     """List movies in FOLDER (JSON to stdout)."""
-    movies = scan.list_movies(folder)
-    click.echo(json.dumps(movies, indent=2))
+    def records():
+        for mv in scan.iter_movies(folder, use_index=not no_index, exclude=exclude,
+                                   detect=detect):
+            rec = mv.as_dict()
+            if with_probe:
+                rec.update(probe.probe_file(mv.path) or {})
+            yield rec
+
+    if fmt == "ndjson":
+        for rec in records():
+            click.echo(json.dumps(rec, separators=(",", ":"), ensure_ascii=False))
+        return
+    click.echo(json.dumps(list(records()), indent=2))
 
 
 # ───────────────────────── gen-notes ─────────────────────────
@@ -50,27 +72,58 @@ def gen_notes(folder: str, out: str) -> None:
     Requires TMDB_API_KEY in environment (.env is auto-loaded).
     """
     out_dir = Path(out)
-    for mv in scan.list_movies(folder):
+    for mv in scan.iter_movies(folder):
         try:
-            meta = metadata.movie_details(mv["title"], mv["year"])
+            meta = metadata.movie_details(mv.title, mv.year)
         except (requests.exceptions.RequestException, RuntimeError) as e:
-            click.echo(f"⚠️  {mv['title']} - {e}. Skipping.")
+            click.echo(f"⚠️  {mv.title} - {e}. Skipping.")
             continue
 
         if meta is None:
-            click.echo(f"⚠️  {mv['title']} - not found on TMDb. Skipping.")
+            click.echo(f"⚠️  {mv.title} - not found on TMDb. Skipping.")
             continue
 
-        md_path = markdown.save_markdown(mv, meta, out_dir)
+        md_path = markdown.save_markdown(mv.as_dict(), meta, out_dir)
         click.echo(f"✓ {md_path}")
 
 
 # ─────────────────────── clean-names ────────────────────────
 @movie.command("clean-names")
-@click.argument("folder", type=click.Path(exists=True, file_okay=False))
-def clean_cmd(folder: str) -> None:
+@click.argument("folder", type=click.Path(exists=True, file_okay=False), required=False)
+@click.option("--prefer-quality", is_flag=True,
+              help="Keep only the best version of each Title_(YEAR) (resolution, codec, bitrate)")
+@click.option("--archive-dir", type=click.Path(file_okay=False),
+              help="Where --prefer-quality parks the losers [default: <folder>/.superseded]")
+@click.option("--plan-only", is_flag=True,
+              help="Print the rename plan (JSON) with any collisions instead of renaming")
+@click.option("--apply", "plan_file", type=click.Path(exists=True, dir_okay=False),
+              help="Execute a plan saved from --plan-only without recomputing it")
+@click.option("--workers", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Renames in flight at once (helps on network shares)")
+def clean_cmd(folder: str | None, prefer_quality: bool, archive_dir: str | None,
+              plan_only: bool, plan_file: str | None, workers: int) -> None:
     """Rename movies in place → Nice_Title_(YEAR).ext"""
-    rename.clean_movie_names(Path(folder))
+    if plan_file:
+        plan = json.loads(Path(plan_file).read_text())
+        renamed = rename.apply_plan(plan, workers)
+        wanted = [u["src"] for u in plan["renames"] if u["dst"] != u["src"]]
+        click.echo(f"✅ Applied {len(renamed)} of {len(wanted)} renames from {plan_file}")
+        for src in wanted:
+            if Path(src) not in renamed:
+                click.echo(f"✗ {src} not renamed", err=True)
+        return
+    if not folder:
+        raise click.UsageError("FOLDER is required unless --apply is given")
+    if plan_only:
+        if prefer_quality:
+            raise click.UsageError("--prefer-quality archives files; it cannot be planned")
+        plan = rename.plan_renames(Path(folder).iterdir())
+        click.echo(json.dumps(plan, indent=2, ensure_ascii=False))
+        if plan["conflicts"]:
+            click.echo(f"{len(plan['conflicts'])} renames skipped - see \"conflicts\"", err=True)
+        return
+    rename.clean_movie_names(Path(folder), prefer_quality,
+                             Path(archive_dir) if archive_dir else None, workers)
 
 
 # ─────────────────────── series-rename ──────────────────────
@@ -84,14 +137,49 @@ def series_rename_cmd(name: str, dry_run: bool, folder: str) -> None:
 
 
 # ───────────────────────── move files ───────────────────────
+_PAST = {"rename": "renamed", "copy": "copied", "reflink": "reflinked", "hardlink": "hardlinked"}
+
+
 @movie.command("move")
 @click.argument("src", required=False, type=click.Path(exists=True, file_okay=False))
 @click.argument("dst", required=False, type=click.Path(file_okay=False))
 @click.option("--remember", is_flag=True, help="Cache these paths for next run")
-def move_cmd(src: str | None, dst: str | None, remember: bool) -> None:
+@click.option("--no-index", is_flag=True, help="Ignore the scan index and re-read every directory")
+@click.option("--scan-workers", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Threads used to walk SRC (helps on NFS/SMB)")
+@click.option("--follow-symlinks", is_flag=True, help="Descend into symlinked folders (loops are detected)")
+@click.option("--exclude", "-x", multiple=True, metavar="PATTERN",
+              help="Gitignore-style pattern to skip (repeatable; adds to .zelignore)")
+@click.option("--detect", is_flag=True,
+              help="Also sniff files with unknown extensions for a video container signature")
+@click.option("--prefer-quality", is_flag=True,
+              help="Keep only the best version of each Title_(YEAR) (resolution, codec, bitrate)")
+@click.option("--archive-dir", type=click.Path(file_okay=False),
+              help="Where --prefer-quality parks the losers [default: <folder>/.superseded]")
+@click.option("--verify", is_flag=True,
+              help="Hash cross-device copies while copying and check them before deleting the source")
+@click.option("--jobs", "-j", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Concurrent copies per (source disk, destination disk) pair")
+@click.option("--link", type=click.Choice(["auto", "reflink", "hardlink", "copy"]),
+              help="Leave SRC intact (keep seeding): reflink, hardlink or copy into DST")
+@click.option("--also", "extra_dst", multiple=True, type=click.Path(file_okay=False),
+              metavar="DIR", help="Another library root (repeatable); files are spread by free space")
+@click.option("--settle", default=60.0, show_default=True, type=click.FloatRange(min=0),
+              help="Skip files modified in the last N seconds or with a .part/.!qB sibling (0 = off)")
+@click.option("--max-rate", metavar="RATE",
+              help="Cap cross-device copy bandwidth, e.g. 80M (change live via ~/.local/state/zel/move.rate)")
+@click.option("--low-priority", is_flag=True,
+              help="Copy in the idle I/O class (like ionice -c3) so playback is not starved")
+def move_cmd(src: str | None, dst: str | None, remember: bool, no_index: bool,
+             scan_workers: int, follow_symlinks: bool, exclude: Tuple[str, ...],
+             detect: bool, prefer_quality: bool, archive_dir: str | None,
+             verify: bool, jobs: int, link: str | None, extra_dst: Tuple[str, ...],
+             settle: float, max_rate: str | None, low_priority: bool) -> None:
     """
-    Move **all** video files from SRC (recursively) to DST (flat).
-    Duplicates are renamed “[DUP] filename.ext”.
+    Move **all** video files from SRC (recursively) to DST (flat), or
+    across DST and every --also root when the library spans several disks.
+    Files already present byte-for-byte are dropped from SRC; other name
+    clashes become “[DUP] filename.ext”, “[DUP 2] filename.ext” …
     If no SRC/DST is passed, tries saved paths.
     """
     if not src:
@@ -103,19 +191,125 @@ def move_cmd(src: str | None, dst: str | None, remember: bool) -> None:
         click.echo("Error: source and/or destination not provided or saved.")
         return
 
+    try:
+        throttle.configure(throttle.parse_rate(max_rate or "off"), low_priority)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc), param_hint="--max-rate")
+
     src_p, dst_p = Path(src), Path(dst)
-    files = scan.find_video_files(src_p)
-    if not files:
+    infos = list(scan.iter_files(src_p, use_index=not no_index, workers=scan_workers,
+                                 follow_symlinks=follow_symlinks, exclude=exclude,
+                                 detect=detect, settle=settle))
+    if not infos:
         click.echo("No video files found - nothing to move.")
         return
 
-    rename.move_files_to_folder(files, dst_p)
-    click.echo(f"✅ Moved {len(files)} files to {dst_p}")
+    files = [Path(f.path) for f in infos]
+    stats = transfer.MoveStats()
+    started = time.monotonic()
+    roots = [dst_p, *map(Path, extra_dst)]
+    moved = rename.move_files_to_folder(files, roots if extra_dst else dst_p, prefer_quality,
+                                        Path(archive_dir) if archive_dir else None,
+                                        verify=verify, jobs=jobs, link=link,
+                                        sizes={Path(f.path): f.size for f in infos},
+                                        stats=stats,
+                                        sidecars={Path(f.path): [Path(p) for p in f.sidecars]
+                                                  for f in infos if f.sidecars})
+    elapsed = time.monotonic() - started
+    click.echo(f"✅ {'Linked' if link else 'Moved'} {len(moved)} files "
+               f"({stats.total_bytes / 1e9:.2f} GB) to {', '.join(map(str, roots))} "
+               f"in {elapsed:.0f}s")
+    if stats.files:
+        click.echo("   " + ", ".join(
+            f"{n} {_PAST.get(how, how)} ({stats.bytes[how] / 1e9:.2f} GB)"
+            for how, n in stats.files.most_common()))
+    if stats.bytes["copy"] and elapsed:
+        click.echo(f"   copy throughput {stats.bytes['copy'] / 1e6 / elapsed:.1f} MB/s")
+    if len(moved) < len(files):
+        click.echo(f"   {len(files) - len(moved)} identical, lower-quality or unverified files skipped")
 
     if remember:
         paths.save_paths({"last_src": str(src_p), "last_dst": str(dst_p)})
 
 
+# ───────────────────────── watch SRC ────────────────────────
+@movie.command("watch")
+@click.argument("src", required=False, type=click.Path(exists=True, file_okay=False))
+@click.argument("dst", required=False, type=click.Path(file_okay=False))
+@click.option("--debounce", default=5.0, show_default=True, type=float,
+              help="Seconds of quiet before a burst of arrivals is processed")
+@click.option("--no-clean", is_flag=True, help="Move only, keep original filenames")
+@click.option("--settle", default=60.0, show_default=True, type=click.FloatRange(min=0),
+              help="Hold files modified in the last N seconds or with a .part/.!qB sibling (0 = off)")
+@click.option("--exclude", "-x", multiple=True, metavar="PATTERN",
+              help="Gitignore-style pattern to skip (repeatable; adds to .zelignore)")
+def watch_cmd(src: str | None, dst: str | None, debounce: float, no_clean: bool,
+              settle: float, exclude: Tuple[str, ...]) -> None:
+    """
+    Watch SRC and move each finished video into DST as it arrives,
+    cleaning its name on the way. Falls back to saved paths.
+    """
+    src = src or paths.load_saved_path("last_src")
+    dst = dst or paths.load_saved_path("last_dst")
+    if not src or not dst:
+        click.echo("Error: source and/or destination not provided or saved.")
+        return
+
+    dst_p = Path(dst)
+    click.echo(f"👀 Watching {src} → {dst_p} (Ctrl-C to stop)")
+    try:
+        for batch in watch.watch_batches(src, debounce=debounce, settle=settle,
+                                           exclude=exclude):
+            batch = [p for p in batch if p.exists()]     # gone since the event
+            if not batch:
+                continue
+            try:
+                moved = rename.move_files_to_folder(batch, dst_p)
+                if not no_clean:
+                    moved = rename.clean_files(moved)
+            except OSError as e:                        # vanished file, full disk, EACCES …
+                click.echo(f"⚠️  {len(batch)} file(s) from {batch[0].parent} - {e}. "
+                           "Still watching.", err=True)
+                continue
+            for p in moved:
+                click.echo(f"✓ {p}")
+    except KeyboardInterrupt:
+        click.echo("Stopped.")
+
+
+# ───────────────────────── duplicates ───────────────────────
+@movie.command("dupes")
+@click.argument("folders", nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option("--workers", default=4, show_default=True, type=click.IntRange(min=1),
+              help="Hashing threads")
+@click.option("--scan-workers", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Threads used to walk FOLDERS (helps on NFS/SMB)")
+@click.option("--exclude", "-x", multiple=True, metavar="PATTERN",
+              help="Gitignore-style pattern to skip (repeatable; adds to .zelignore)")
+@click.option("--format", "fmt", type=click.Choice(["text", "json"]), default="text",
+              show_default=True)
+def dupes_cmd(folders: Tuple[str, ...], workers: int, scan_workers: int,
+              exclude: Tuple[str, ...], fmt: str) -> None:
+    """
+    Report videos with identical content across FOLDERS: size first,
+    then head/tail hashes, then full hashes only where still needed.
+    """
+    files = [f for folder in folders
+             for f in scan.iter_files(folder, workers=scan_workers, exclude=exclude)]
+    groups = dupes.find_duplicates(files, workers=workers)
+
+    if fmt == "json":
+        click.echo(json.dumps([[f.path for f in g] for g in groups], indent=2))
+        return
+    for g in groups:
+        click.echo(f"{g[0].size:,} bytes × {len(g)}")
+        for f in g:
+            click.echo(f"  {f.path}")
+        click.echo("")
+    wasted = sum(g[0].size * (len(g) - 1) for g in groups)
+    click.echo(f"{len(groups)} duplicate sets, {wasted / 1e9:.2f} GB reclaimable")
+
+
 # ───────────────────────── YTS links ────────────────────────
 @movie.command("yts-links")
 @click.option("--out", "-o", type=click.Path(dir_okay=False), help="Write to file instead of stdout")
@@ -10,6 +10,23 @@ import re
 # ───────────────────────── video file types ──────────────────────────
 VIDEO_EXTS: tuple[str, ...] = (".mp4", ".mkv", ".avi")
 
+# losers of --prefer-quality are parked here inside the library
+SUPERSEDED_DIR = ".superseded"
+
+# never worth sniffing for a container signature (``--detect`` mode)
+NON_VIDEO_EXTS: frozenset[str] = frozenset({
+    ".txt", ".nfo", ".md", ".json", ".xml", ".html", ".url", ".log",
+    ".srt", ".ass", ".ssa", ".sub", ".idx", ".vtt", ".sup",
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tbn",
+    ".mp3", ".flac", ".aac", ".ac3", ".dts", ".wav", ".ogg", ".opus", ".m4a",
+    ".zip", ".rar", ".7z", ".gz", ".tar", ".par2", ".sfv", ".torrent",
+    ".exe", ".dll", ".iso", ".pdf", ".db", ".ini",
+})
+
+# Incomplete-download markers: "x.mkv.part" (Transmission, browsers) and
+# "x.mkv.!qB" (qBittorrent). Compared in lower case.
+PARTIAL_SUFFIXES: tuple[str, ...] = (".part", ".!qb")
+
 # ───────────────────────── filename patterns ─────────────────────────
 MOVIE_RE = re.compile(r"""^(?P<title>.+?)_\((?P<year>\d{4})\)\.[^.]+$""", re.VERBOSE)
 
@@ -33,3 +50,7 @@ _DATA_ROOT = Path(os.getenv("XDG_STATE_HOME", "~/.local/state")).expanduser() /
 _DATA_ROOT.mkdir(parents=True, exist_ok=True)
 
 PATHS_JSON = _DATA_ROOT / "paths.json"   # file is created on first save()
+INDEX_JSON = _DATA_ROOT / "scan.index.json"   # per-directory scan cache
+MAGIC_JSON = _DATA_ROOT / "magic.cache.json"  # sniffed containers by inode
+FINGERPRINT_JSON = _DATA_ROOT / "fingerprints.json"  # content digests by inode
+RATE_FILE = _DATA_ROOT / "move.rate"  # live copy bandwidth limit, e.g. "80M"
@@ -0,0 +1,129 @@
+"""
+Magic-byte container detection for files whose extension is missing,
+uncommon (.m4v, .webm, .ts …) or simply wrong.
+
+Only the first few hundred bytes are read, on a thread pool, and the
+verdict is cached by ``(st_dev, st_ino, st_mtime_ns)`` in
+~/.local/state/zel/magic.cache.json so repeat scans never reread a header.
+The cache is loaded on first use, a new verdict for an inode replaces its
+old one, and only the MAX_ENTRIES most recently used are kept.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .constants import MAGIC_JSON
+from .probe import EBML_MAGIC
+
+# 189 bytes is the least that confirms two MPEG-TS sync bytes (188-byte packets)
+HEAD_BYTES = 200
+
+MAX_ENTRIES = 50_000
+
+_CACHE: Optional[Dict[str, str]] = None
+_INODES: Dict[str, str] = {}                # "dev:ino" → current key
+_lock = threading.Lock()
+_dirty = False
+
+
+def _cache() -> Dict[str, str]:
+    """The verdict cache, read from disk on first use."""
+    global _CACHE
+    with _lock:
+        if _CACHE is None:
+            try:
+                _CACHE = json.loads(MAGIC_JSON.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                _CACHE = {}
+            _INODES.update((k.rsplit(":", 1)[0], k) for k in _CACHE)
+        return _CACHE
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Container name for a file starting with *head*, or None."""
+    if head.startswith(EBML_MAGIC):
+        return "webm" if b"webm" in head[:64] else "matroska"
+    if head[4:8] == b"ftyp":
+        return "mov" if head[8:12] == b"qt  " else "mp4"
+    if head[4:8] in (b"moov", b"mdat", b"wide", b"free"):
+        return "mov"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head[:4] == b"\x00\x00\x01\xba":
+        return "mpeg"
+    if head[:8] == b"\x30\x26\xb2\x75\x8e\x66\xcf\x11":
+        return "asf"
+    if head[:3] == b"FLV":
+        return "flv"
+    if head[:4] == b"OggS" and b"theora" in head[:64]:
+        return "ogg"
+    if len(head) > 188 and head[0] == 0x47 and head[188] == 0x47:
+        return "mpegts"
+    if len(head) > 196 and head[4] == 0x47 and head[196] == 0x47:
+        return "m2ts"
+    return None
+
+
+def _key(st: os.stat_result) -> str:
+    return f"{st.st_dev}:{st.st_ino}:{st.st_mtime_ns}"
+
+
+def _classify(path: str) -> Tuple[Optional[str], Optional[os.stat_result]]:
+    global _dirty
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    key = _key(st)
+    cache = _cache()
+    with _lock:
+        if key in cache:
+            cache[key] = cache.pop(key)      # most recently used
+            return cache[key] or None, st
+    try:
+        with open(path, "rb", buffering=0) as f:
+            kind = sniff(f.read(HEAD_BYTES))
+    except OSError:
+        return None, st
+    with _lock:
+        inode = key.rsplit(":", 1)[0]
+        old = _INODES.get(inode)
+        if old is not None and old != key:   # rewritten since it was sniffed
+            cache.pop(old, None)
+        _INODES[inode] = key
+        cache[key] = kind or ""
+        _dirty = True
+    return kind, st
+
+
+def classify_many(paths: Sequence[str], workers: int = 8
+                  ) -> List[Tuple[Optional[str], Optional[os.stat_result]]]:
+    """
+    ``(container or None, stat)`` for each of *paths*, in order. Cache
+    misses have their header read on a pool of *workers* threads.
+    """
+    if len(paths) <= 1 or workers <= 1:
+        return [_classify(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths)),
+                            thread_name_prefix="zelmagic") as pool:
+        return list(pool.map(_classify, paths))
+
+
+def save_cache() -> None:
+    """Persist new verdicts (no-op when nothing was sniffed), dropping the least used."""
+    global _dirty
+    with _lock:
+        if not _dirty or _CACHE is None:
+            return
+        for key in list(_CACHE)[:max(len(_CACHE) - MAX_ENTRIES, 0)]:
+            del _CACHE[key]
+            _INODES.pop(key.rsplit(":", 1)[0], None)
+        MAGIC_JSON.parent.mkdir(parents=True, exist_ok=True)
+        tmp = MAGIC_JSON.with_name(f".{MAGIC_JSON.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(_CACHE, separators=(",", ":")))
+        os.replace(tmp, MAGIC_JSON)
+        _dirty = False
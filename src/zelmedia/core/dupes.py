@@ -0,0 +1,65 @@
+"""
+fdupes-style content duplicate finder.
+
+Stage 1 buckets files by size (known from the walk, no I/O). Stage 2
+hashes only the head and tail blocks of files that share a size. Stage 3
+hashes whole files, and only those still colliding after stage 2. Hashing
+runs on a thread pool since hashlib releases the GIL, and every digest
+is cached by ``scan.fingerprints``.
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import scan
+from .fingerprint import covers_whole_file
+from .scan import FileInfo
+
+log = logging.getLogger(__name__)
+
+
+def _regroup(groups: Iterable[List[FileInfo]],
+             digests: Dict[str, Dict[str, Optional[str]]], kind: str) -> List[List[FileInfo]]:
+    """Split every group by its *kind* digest, keeping only collisions."""
+    out: List[List[FileInfo]] = []
+    for group in groups:
+        buckets: Dict[str, List[FileInfo]] = defaultdict(list)
+        for f in group:
+            d = digests.get(f.path, {}).get(kind)
+            if d is not None:
+                buckets[d].append(f)
+        out.extend(b for b in buckets.values() if len(b) > 1)
+    return out
+
+
+def find_duplicates(files: Iterable[FileInfo], workers: int = 4) -> List[List[FileInfo]]:
+    """
+    Group *files* whose content is byte-identical. Each returned group has
+    two or more entries sorted by path; largest files come first. Empty
+    files are ignored, and so is a second path to an inode already seen
+    (overlapping folders, hardlinks): it holds no extra copy. Digests come
+    from (and go to) the fingerprint store, so unchanged files are not
+    re-read on the next run. Sizes are taken from a fresh stat, not the
+    scan index.
+    """
+    by_size: Dict[int, List[FileInfo]] = defaultdict(list)
+    seen: Set[Tuple[int, int]] = set()
+    for f in scan.restat(files):
+        if f.size and (f.dev, f.ino) not in seen:
+            seen.add((f.dev, f.ino))
+            by_size[f.size].append(f)
+    candidates = [g for g in by_size.values() if len(g) > 1]
+    log.info("%d size collisions", len(candidates))
+
+    partial = scan.fingerprints([f for g in candidates for f in g], workers=workers)
+    groups = _regroup(candidates, partial, "partial")
+    settled = [g for g in groups if covers_whole_file(g[0].size)]
+    pending = [g for g in groups if not covers_whole_file(g[0].size)]
+    full = scan.fingerprints([f for g in pending for f in g], full=True, workers=workers)
+    groups = settled + _regroup(pending, full, "full")
+
+    groups = [sorted(g) for g in groups]
+    groups.sort(key=lambda g: (-g[0].size, g[0].path))
+    return groups
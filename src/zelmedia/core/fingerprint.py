@@ -0,0 +1,136 @@
+"""
+Content fingerprints and their persistent store.
+
+``head_tail_digests`` reads the first and last BLOCK bytes once and turns
+them into a BLAKE2b "partial" digest (with the size mixed in) plus the
+OpenSubtitles movie hash. ``full_digest`` hashes the whole file and is
+only worth computing for files that still collide after the partial
+stage.
+
+Results are kept in ~/.local/state/zel/fingerprints.json keyed on
+``(st_dev, st_ino, size, mtime_ns)``, so a multi-GB file is hashed once
+until it is modified or replaced. A new key for an inode replaces its
+old one, and the store keeps only the MAX_ENTRIES most recently used.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .constants import FINGERPRINT_JSON
+
+BLOCK = 64 * 1024
+MAX_ENTRIES = 50_000
+_CHUNK = 1 << 20
+_MASK64 = (1 << 64) - 1
+
+
+# ─────────────────────────── digest helpers ───────────────────────────
+def _osdb_sum(block: bytes) -> int:
+    words = len(block) // 8
+    return sum(struct.unpack(f"<{words}Q", block[:words * 8]))
+
+
+def head_tail_digests(path: str, size: int) -> Tuple[str, Optional[str]]:
+    """
+    ``(partial, osdb)`` for *path*. ``partial`` is BLAKE2b over *size*, the
+    head block and the tail block; ``osdb`` is the 16-hex-digit
+    OpenSubtitles hash, or None for files shorter than two blocks.
+    """
+    with open(path, "rb", buffering=0) as f:
+        head = f.read(BLOCK)
+        tail = b""
+        if size > BLOCK:
+            f.seek(max(BLOCK, size - BLOCK))
+            tail = f.read(BLOCK)
+    h = hashlib.blake2b(size.to_bytes(8, "little"), digest_size=20)
+    h.update(head)
+    h.update(tail)
+    osdb = None
+    if size >= 2 * BLOCK:
+        osdb = f"{(size + _osdb_sum(head) + _osdb_sum(tail)) & _MASK64:016x}"
+    return h.hexdigest(), osdb
+
+
+def full_digest(path: str) -> str:
+    """BLAKE2b of the whole of *path* (hashlib drops the GIL while hashing)."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb", buffering=0) as f:
+        buf = bytearray(_CHUNK)
+        view = memoryview(buf)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+def covers_whole_file(size: int) -> bool:
+    """True when the partial digest already saw every byte."""
+    return size <= 2 * BLOCK
+
+
+# ─────────────────────────── persistent store ─────────────────────────
+def store_key(dev: int, ino: int, size: int, mtime_ns: int) -> str:
+    return f"{dev}:{ino}:{size}:{mtime_ns}"
+
+
+def _inode(key: str) -> str:
+    """The ``dev:ino`` part of a `store_key`."""
+    return ":".join(key.split(":", 2)[:2])
+
+
+class FingerprintStore:
+    """
+    ``store_key(...) → {"partial", "osdb", "full"}``; any of the digests may
+    be missing if it has not been needed yet. Thread-safe; entries are
+    kept in least-recently-used order.
+    """
+
+    def __init__(self, path: Path = FINGERPRINT_JSON) -> None:
+        self.path = Path(path)
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            self._entries: Dict[str, Dict[str, Optional[str]]] = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._entries = {}
+        self._keys = {_inode(k): k for k in self._entries}     # inode → current key
+
+    def get(self, key: str) -> Dict[str, Optional[str]]:
+        with self._lock:
+            rec = self._entries.pop(key, None)
+            if rec is None:
+                return {}
+            self._entries[key] = rec        # most recent; persisted with the next save
+            return dict(rec)
+
+    def update(self, key: str, **digests: Optional[str]) -> None:
+        with self._lock:
+            old = self._keys.get(_inode(key))
+            if old is not None and old != key:                  # rewritten or replaced
+                self._entries.pop(old, None)
+            self._keys[_inode(key)] = key
+            self._entries.setdefault(key, {}).update(digests)
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write the store atomically if anything changed, dropping the least used."""
+        with self._lock:
+            if not self._dirty:
+                return
+            extra = len(self._entries) - MAX_ENTRIES
+            for key in list(self._entries)[:max(extra, 0)]:
+                del self._entries[key]
+                self._keys.pop(_inode(key), None)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(self._entries, separators=(",", ":")))
+            os.replace(tmp, self.path)
+            self._dirty = False
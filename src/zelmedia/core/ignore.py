@@ -0,0 +1,141 @@
+"""
+Gitignore-style exclude rules for scanning.
+
+Patterns come from a ``.zelignore`` file in the scan root plus any
+``--exclude`` given on the command line, and are compiled once into a
+single regex. The walker checks every sub-directory before reading it,
+so an excluded subtree (``.incomplete/``, ``Sample/`` …) is never listed.
+
+Supported syntax: ``#`` comments, ``!`` negation, trailing ``/`` for
+directories only, leading ``/`` (or any inner ``/``) to anchor at the
+root, ``*``, ``?``, ``[...]`` and ``**``. As in git, the last matching
+pattern wins.
+"""
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+IGNORE_FILE = ".zelignore"
+
+
+def _translate(glob: str) -> str:
+    """Turn one glob (without leading/trailing slash) into a regex fragment."""
+    out: List[str] = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if glob.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            j = glob.find("]", i + 2 if glob[i + 1:i + 2] in ("!", "]") else i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            body = glob[i + 1:j].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = j + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def _compile(rules: List[Tuple[str, bool]]) -> Optional[re.Pattern]:
+    """
+    One alternation, newest pattern first, with a named group per rule so
+    the first alternative that matches is the one git would apply.
+    """
+    if not rules:
+        return None
+    parts = [f"(?P<{'n' if neg else 'p'}{i}>{rx})"
+             for i, (rx, neg) in enumerate(reversed(rules))]
+    return re.compile("(?:" + "|".join(parts) + ")")
+
+
+class IgnoreRules:
+    """Compiled matcher for relative POSIX paths below a scan root."""
+
+    def __init__(self, patterns: Iterable[str] = (), root: Optional[str] = None) -> None:
+        self.root = root                    # what paths are relative to, if known
+        self.patterns: List[str] = []
+        dir_rules: List[Tuple[str, bool]] = []
+        file_rules: List[Tuple[str, bool]] = []
+        for raw in patterns:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            self.patterns.append(line)
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            if line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            anchored = "/" in line.rstrip("/")
+            line = line.strip("/")
+            if not line:
+                continue
+            rx = _translate(line)
+            if not anchored:
+                rx = "(?:.*/)?" + rx
+            dir_rules.append((rx, negate))
+            if not dir_only:
+                file_rules.append((rx, negate))
+        self._dirs = _compile(dir_rules)
+        self._files = _compile(file_rules)
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def excluded(self, relpath: str, is_dir: bool) -> bool:
+        """True if *relpath* (``/``-separated, relative to the root) is ignored."""
+        rx = self._dirs if is_dir else self._files
+        if rx is None:
+            return False
+        m = rx.fullmatch(relpath)
+        return m is not None and m.lastgroup[0] == "p"
+
+    def hides(self, relpath: str, is_dir: bool = False) -> bool:
+        """
+        True if *relpath* is ignored or lies in a directory that is - what
+        a walk that never enters excluded directories would skip.
+        """
+        parts = relpath.split("/")
+        return (any(self.excluded("/".join(parts[:i]), is_dir=True)
+                    for i in range(1, len(parts)))
+                or self.excluded(relpath, is_dir))
+
+
+def load_rules(root: str | Path, extra: Iterable[str] = ()) -> IgnoreRules:
+    """Rules from ``root/.zelignore`` followed by *extra* patterns, relative to *root*."""
+    lines: List[str] = []
+    try:
+        lines = Path(root, IGNORE_FILE).read_text(encoding="utf-8").splitlines()
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return IgnoreRules([*lines, *extra], root=str(root))
+
+
+def relative(root: str, path: str) -> str:
+    """POSIX relative path of *path* below *root* (both absolute)."""
+    rel = path[len(root):].lstrip(os.sep)
+    return rel if os.sep == "/" else rel.replace(os.sep, "/")
@@ -0,0 +1,103 @@
+"""
+Persistent scan index.
+
+Remembers, per directory, its mtime plus the video files and
+sub-directories it held at the last scan. A rescan still stats every
+directory (a change deep in the tree does not bubble up to its
+parents) but only re-reads the ones whose mtime moved.
+
+Lives at  ~/.local/state/zel/scan.index.json  next to paths.json.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from .constants import INDEX_JSON
+
+INDEX_VERSION = 5
+
+# A directory touched this recently may still change within the same
+# mtime tick, so it is stored but never trusted on the next lookup.
+_RACY_WINDOW_NS = 2_000_000_000
+
+# [name, size, mtime_ns, dev, ino]
+FileRow = List
+
+
+class DirRecord(NamedTuple):
+    """One directory listing, each part sorted by name."""
+    files: List[FileRow]        # video rows
+    subdirs: List[str]
+    linked: List[str]           # symlinked sub-directories
+    others: List[str]           # files of unknown type that --detect may sniff
+    sidecars: List[str]         # subtitles/.nfo/artwork
+
+
+class LibraryIndex:
+    """Directory-mtime keyed cache of scan results."""
+
+    def __init__(self, path: Path = INDEX_JSON) -> None:
+        self.path = Path(path)
+        self._dirs: Dict[str, dict] = {}
+        self._seen: Set[str] = set()
+        self._dirty = False
+        self._load()
+
+    # ── persistence ──────────────────────────────────────────────
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if data.get("version") == INDEX_VERSION:
+            self._dirs = data.get("dirs", {})
+
+    def save(self) -> None:
+        """Write the index atomically if anything changed."""
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"version": INDEX_VERSION, "dirs": self._dirs},
+                                  separators=(",", ":")))
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    # ── lookup / update ──────────────────────────────────────────
+    def lookup(self, directory: str, mtime_ns: int) -> Optional[DirRecord]:
+        """The `DirRecord` of *directory* if its mtime is unchanged, else None."""
+        self._seen.add(directory)
+        rec = self._dirs.get(directory)
+        if rec is None or rec["mtime"] != mtime_ns:
+            return None
+        return DirRecord(rec["files"], rec["dirs"], rec["links"], rec["others"], rec["sidecars"])
+
+    def store(self, directory: str, mtime_ns: int, rec: DirRecord) -> None:
+        """Record a fresh listing of *directory*."""
+        self._seen.add(directory)
+        if time.time_ns() - mtime_ns < _RACY_WINDOW_NS:
+            mtime_ns = -1
+        self._dirs[directory] = {"mtime": mtime_ns, "files": rec.files,
+                                 "dirs": rec.subdirs, "links": rec.linked,
+                                 "others": rec.others, "sidecars": rec.sidecars,
+                                 "scanned": time.time_ns()}
+        self._dirty = True
+
+    def scanned(self, directory: str) -> Optional[int]:
+        """``time_ns()`` at which *directory* was last listed, if known."""
+        rec = self._dirs.get(directory)
+        return rec.get("scanned") if rec is not None else None
+
+    def prune(self, root: str) -> None:
+        """Forget directories below *root* that the last full walk did not visit."""
+        prefix = root.rstrip(os.sep) + os.sep
+        stale = [d for d in self._dirs
+                 if (d == root or d.startswith(prefix)) and d not in self._seen]
+        for d in stale:
+            del self._dirs[d]
+        if stale:
+            self._dirty = True
@@ -0,0 +1,89 @@
+"""
+Spread a batch of moves over several library roots (one per disk).
+
+The whole plan is made before anything moves, from sizes the scan
+already knows and ``os.statvfs`` free space, so the moves themselves can
+then run concurrently per destination disk:
+
+* a title that already lives on one root goes to that root, so versions,
+  sidecars and archives of one movie stay on one disk;
+* a file already on the same filesystem as a root goes there - a rename
+  costs no space and no I/O;
+* everything else, largest first, goes to the root with the most free
+  space left after the files planned so far.
+
+Roots on the same filesystem share one free-space budget.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+log = logging.getLogger(__name__)
+
+# keep this much free on every disk (filesystems slow down when nearly full)
+RESERVE_BYTES = 1 << 30
+
+
+def free_bytes(root: Path) -> int:
+    """Space available to unprivileged writers on *root*'s filesystem."""
+    st = os.statvfs(root)
+    return st.f_bavail * st.f_frsize
+
+
+def plan(files: Sequence[Path], roots: Sequence[Path], sizes: Mapping[Path, int],
+         key: Optional[Callable[[Path], Optional[str]]] = None,
+         existing: Optional[Mapping[str, Path]] = None,
+         reserve: int = RESERVE_BYTES) -> Dict[Path, Path]:
+    """
+    ``{file: root}`` for every file in *files* that fits somewhere; files
+    that fit nowhere are logged and left out. *key* maps a file to its
+    title (None for no title) and *existing* maps titles to the root that
+    already holds them; files of one title in this batch also stay together.
+    """
+    devs = {root: os.stat(root).st_dev for root in roots}
+    budget: Dict[int, int] = {}
+    for root, dev in devs.items():
+        budget.setdefault(dev, free_bytes(root) - reserve)
+    homes: Dict[str, Path] = dict(existing or {})
+    titles = {f: key(f) if key is not None else None for f in files}
+
+    def take(f: Path, root: Path, size: int) -> None:
+        out[f] = root
+        budget[devs[root]] -= size
+        if titles[f] is not None:
+            homes.setdefault(titles[f], root)
+
+    out: Dict[Path, Path] = {}
+    rest: List[Path] = []
+    for f in files:
+        try:
+            src_dev = os.stat(f).st_dev
+        except OSError:
+            continue
+        same = next((r for r in roots if devs[r] == src_dev), None)
+        home = homes.get(titles[f]) if titles[f] is not None else None
+        if home is None and same is not None:
+            home = same
+        if home is None:
+            rest.append(f)
+        elif devs[home] == src_dev:             # rename: no space needed
+            take(f, home, 0)
+        elif budget[devs[home]] >= sizes.get(f, 0):
+            take(f, home, sizes.get(f, 0))
+        else:
+            log.info("%s is full - %s goes elsewhere", home, f.name)
+            rest.append(f)
+
+    for f in sorted(rest, key=lambda p: -sizes.get(p, 0)):
+        size = sizes.get(f, 0)
+        home = homes.get(titles[f]) if titles[f] is not None else None
+        root = home if home is not None and budget[devs[home]] >= size \
+            else max(roots, key=lambda r: budget[devs[r]])
+        if budget[devs[root]] < size:
+            log.warning("No destination has room for %s (%.1f GB)", f.name, size / 1e9)
+            continue
+        take(f, root, size)
+    return out
@@ -0,0 +1,250 @@
+"""
+Header-only container probe - duration, resolution and video codec
+without ffprobe.
+
+Matroska: walks the EBML tree down to Segment ▸ Info and Segment ▸ Tracks
+and stops at the first Cluster. MP4/MOV: walks the top-level boxes to
+``moov`` (seeking over ``mdat`` rather than reading it) and reads only
+``mvhd``, ``tkhd``, ``hdlr`` and the first ``stsd`` entry. Anything that
+is skipped is skipped with ``seek``, so a probe costs a few KB of reads
+regardless of file size.
+"""
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+# ───────────────────────── codec name mapping ─────────────────────────
+_MKV_CODECS = {
+    "V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_AV1": "av1",
+    "V_VP9": "vp9", "V_VP8": "vp8", "V_MPEG4/ISO/ASP": "mpeg4",
+    "V_MPEG4/ISO/SP": "mpeg4", "V_MPEG2": "mpeg2", "V_MPEG1": "mpeg1",
+    "V_MS/VFW/FOURCC": "vfw",
+}
+_MP4_CODECS = {
+    "avc1": "h264", "avc3": "h264", "hev1": "hevc", "hvc1": "hevc",
+    "dvhe": "hevc", "dvh1": "hevc", "av01": "av1", "vp09": "vp9",
+    "vp08": "vp8", "mp4v": "mpeg4",
+}
+
+
+def _result(container: str) -> Dict:
+    return {"container": container, "duration": None,
+            "width": None, "height": None, "codec": None}
+
+
+# ───────────────────────────── Matroska ───────────────────────────────
+EBML_MAGIC   = b"\x1a\x45\xdf\xa3"
+_SEGMENT     = 0x18538067
+_INFO        = 0x1549A966
+_TRACKS      = 0x1654AE6B
+_CLUSTER     = 0x1F43B675
+_TIMESCALE   = 0x2AD7B1
+_DURATION    = 0x4489
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE  = 0x83
+_CODEC_ID    = 0x86
+_VIDEO       = 0xE0
+_PIXEL_W     = 0xB0
+_PIXEL_H     = 0xBA
+
+
+def _vint(f: BinaryIO, keep_marker: bool) -> Optional[int]:
+    first = f.read(1)
+    if not first:
+        return None
+    b = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not b & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("invalid EBML vint")
+    value = b if keep_marker else b & (mask - 1)
+    rest = f.read(length - 1)
+    if len(rest) != length - 1:
+        return None
+    for byte in rest:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return -1                                   # "unknown size"
+    return value
+
+
+def _ebml_children(f: BinaryIO, end: Optional[int]) -> Iterator[Tuple[int, int, int]]:
+    """Yield ``(id, payload_offset, size)`` for elements up to *end*."""
+    while end is None or f.tell() < end:
+        eid = _vint(f, keep_marker=True)
+        size = _vint(f, keep_marker=False) if eid is not None else None
+        if eid is None or size is None:
+            return
+        start = f.tell()
+        yield eid, start, size
+        if size < 0:                # unknown size: only allowed for containers
+            return
+        f.seek(start + size)
+
+
+def _read_uint(f: BinaryIO, size: int) -> Optional[int]:
+    """Unsigned EBML integer; None for a size no valid one has (0-8 bytes)."""
+    if not 0 <= size <= 8:          # never let a corrupt size drive the read
+        return None
+    data = f.read(size)
+    return int.from_bytes(data, "big") if len(data) == size else None
+
+
+def _read_float(f: BinaryIO, size: int) -> Optional[float]:
+    if size not in (4, 8):
+        return None
+    data = f.read(size)
+    if len(data) != size:
+        return None
+    return struct.unpack(">f" if size == 4 else ">d", data)[0]
+
+
+def _probe_mkv(f: BinaryIO) -> Dict:
+    out = _result("matroska")
+    f.seek(0)
+    for eid, start, size in _ebml_children(f, None):
+        if eid == _SEGMENT:
+            seg_end = None if size < 0 else start + size
+            break
+    else:
+        return out
+
+    timescale, duration = 1_000_000, None
+    have_info = have_tracks = False
+    for eid, start, size in _ebml_children(f, seg_end):
+        if eid == _CLUSTER or (have_info and have_tracks):
+            break
+        if eid == _INFO:
+            have_info = True
+            for cid, _, csize in _ebml_children(f, start + size):
+                if cid == _TIMESCALE:
+                    timescale = _read_uint(f, csize) or timescale
+                elif cid == _DURATION:
+                    duration = _read_float(f, csize)
+        elif eid == _TRACKS:
+            have_tracks = True
+            for tid, tstart, tsize in _ebml_children(f, start + size):
+                if tid != _TRACK_ENTRY or out["codec"]:
+                    continue
+                track: Dict = {}
+                for cid, cstart, csize in _ebml_children(f, tstart + tsize):
+                    if cid == _TRACK_TYPE:
+                        track["type"] = _read_uint(f, csize)
+                    elif cid == _CODEC_ID and 0 <= csize <= 64:
+                        track["codec"] = f.read(csize).rstrip(b"\0").decode("ascii", "replace")
+                    elif cid == _VIDEO:
+                        for vid, _, vsize in _ebml_children(f, cstart + csize):
+                            if vid == _PIXEL_W:
+                                track["width"] = _read_uint(f, vsize)
+                            elif vid == _PIXEL_H:
+                                track["height"] = _read_uint(f, vsize)
+                if track.get("type") == 1:
+                    codec = track.get("codec", "")
+                    out["codec"] = _MKV_CODECS.get(codec, codec.lower() or None)
+                    out["width"] = track.get("width")
+                    out["height"] = track.get("height")
+
+    if duration is not None:
+        out["duration"] = round(duration * timescale / 1e9, 3)
+    return out
+
+
+# ───────────────────────────── ISO-BMFF ───────────────────────────────
+_MP4_CONTAINERS = {b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _boxes(f: BinaryIO, end: Optional[int]) -> Iterator[Tuple[bytes, int, int]]:
+    """Yield ``(type, payload_offset, payload_size)`` up to *end* (None = EOF)."""
+    while end is None or f.tell() + 8 <= end:
+        hdr = f.read(8)
+        if len(hdr) < 8:
+            return
+        size, btype = struct.unpack(">I4s", hdr)
+        header = 8
+        if size == 1:
+            ext = f.read(8)
+            if len(ext) < 8:
+                return
+            size = struct.unpack(">Q", ext)[0]
+            header = 16
+        elif size == 0:                         # box runs to end of file
+            here = f.tell()
+            f.seek(0, 2)
+            size = f.tell() - here + header
+            f.seek(here)
+        if size < header:
+            return
+        start = f.tell()
+        yield btype, start, size - header
+        f.seek(start + size - header)
+
+
+def _parse_trak(f: BinaryIO, start: int, size: int, track: Dict) -> None:
+    for btype, bstart, bsize in _boxes(f, start + size):
+        if btype in _MP4_CONTAINERS:
+            _parse_trak(f, bstart, bsize, track)
+        elif btype == b"tkhd" and bsize >= 8 and bsize <= 256:
+            data = f.read(bsize)
+            w, h = struct.unpack(">II", data[-8:])
+            track.setdefault("width", w >> 16)
+            track.setdefault("height", h >> 16)
+        elif btype == b"hdlr" and bsize >= 12:
+            track["handler"] = f.read(12)[8:12]
+        elif btype == b"stsd" and bsize >= 16:
+            data = f.read(min(bsize, 8 + 8 + 28))
+            track["codec"] = data[12:16].decode("ascii", "replace")
+            if len(data) >= 44:
+                w, h = struct.unpack(">HH", data[40:44])
+                if w and h:
+                    track["width"], track["height"] = w, h
+
+
+def _probe_mp4(f: BinaryIO) -> Dict:
+    out = _result("mp4")
+    f.seek(0)
+    for btype, start, size in _boxes(f, None):
+        if btype != b"moov":
+            continue                             # mdat & co are seeked over
+        for mtype, mstart, msize in _boxes(f, start + size):
+            if mtype == b"mvhd" and msize <= 256:
+                data = f.read(msize)
+                if data[0] == 1:
+                    timescale, duration = struct.unpack(">IQ", data[20:32])
+                else:
+                    timescale, duration = struct.unpack(">II", data[12:20])
+                if timescale:
+                    out["duration"] = round(duration / timescale, 3)
+            elif mtype == b"trak" and not out["codec"]:
+                track: Dict = {}
+                _parse_trak(f, mstart, msize, track)
+                if track.get("handler") == b"vide":
+                    codec = track.get("codec", "")
+                    out["codec"] = _MP4_CODECS.get(codec, codec.strip() or None)
+                    out["width"] = track.get("width")
+                    out["height"] = track.get("height")
+        break
+    return out
+
+
+# ─────────────────────────── public helper ────────────────────────────
+def probe_file(path: str | Path) -> Optional[Dict]:
+    """
+    Return ``{"container", "duration", "width", "height", "codec"}`` for a
+    Matroska/WebM or MP4/MOV file, or None if the format is not recognised
+    or the header is unreadable. Duration is in seconds.
+    """
+    try:
+        with open(path, "rb", buffering=8192) as f:
+            head = f.read(12)
+            if head.startswith(EBML_MAGIC):
+                return _probe_mkv(f)
+            if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip"):
+                return _probe_mp4(f)
+    except (OSError, ValueError, struct.error, IndexError):
+        return None
+    return None
@@ -0,0 +1,54 @@
+"""
+Rank two versions of the same movie from their container headers.
+
+Order of preference: higher resolution, then the more efficient codec,
+then the higher bitrate. Everything comes from `probe.probe_file`, so
+comparing two 30 GB remuxes costs a few KB of reads. A file whose header
+yields no resolution (AVI, a truncated download …) is not ranked at all.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+from .probe import probe_file
+
+log = logging.getLogger(__name__)
+
+CODEC_RANK = {"av1": 4, "hevc": 3, "vp9": 3, "h264": 2, "vp8": 1, "mpeg4": 1,
+              "mpeg2": 0, "mpeg1": 0}
+
+
+def quality(path: str | Path) -> Optional[Tuple[int, int, float]]:
+    """
+    ``(pixels, codec rank, bits per second)``, or None when the header
+    gives no resolution; other unknown fields count as 0 (codec: -1).
+    """
+    info = probe_file(path) or {}
+    pixels = (info.get("width") or 0) * (info.get("height") or 0)
+    if not pixels:
+        return None
+    rank = CODEC_RANK.get(info.get("codec") or "", -1)
+    bitrate = 0.0
+    duration = info.get("duration")
+    if duration:
+        try:
+            bitrate = os.path.getsize(path) * 8 / duration
+        except OSError:
+            pass
+    return pixels, rank, bitrate
+
+
+def better(current: Path, candidate: Path) -> Optional[Path]:
+    """
+    Whichever of the two files to keep; ties keep *current*. None when
+    either one cannot be ranked - the caller must then keep both.
+    """
+    q_cur, q_new = quality(current), quality(candidate)
+    log.debug("quality %s=%s vs %s=%s", current.name, q_cur, candidate.name, q_new)
+    if q_cur is None or q_new is None:
+        log.info("Cannot compare %s with %s - keeping both", current.name, candidate.name)
+        return None
+    return candidate if q_new > q_cur else current
@@ -3,11 +3,14 @@ Filename clean-up & move helpers.
 """
 from __future__ import annotations
 
+import errno
 import logging
+import os
 import re
-import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, List, Mapping, Sequence
 
 from tqdm import tqdm
 
@@ -15,6 +18,12 @@ from .constants import (
     UNWANTED_WORDS, _UNWANTED_EQUAL,
     VIDEO_EXTS, YEAR_RE,
     PAREN_YEAR_SEARCH, READY_PATTERN,
+    SUPERSEDED_DIR,
+)
+from . import placement, quality, schedule, sidecar, transfer
+from .ignore import IgnoreRules
+from .fingerprint import (
+    FingerprintStore, covers_whole_file, full_digest, head_tail_digests, store_key,
 )
 
 log = logging.getLogger(__name__)
@@ -91,35 +100,558 @@ def build_clean_name(original: Path) -> Path:
 
 
 
+# ─────────────────────────── move helpers ─────────────────────────────
+def _dup_name(name: str, n: int) -> str:
+    """“[DUP] name”, then “[DUP 2] name”, “[DUP 3] name” …"""
+    return f"[DUP] {name}" if n == 1 else f"[DUP {n}] {name}"
+
+
+def _same_inode(a: Path, b: Path) -> bool:
+    try:
+        sa, sb = a.stat(), b.stat()
+    except OSError:
+        return False
+    return (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino)
+
+
+def same_content(a: Path, b: Path) -> bool:
+    """
+    Cheap identity check: same inode, or same size plus the same
+    head/tail BLAKE2b digest. Never reads more than 2 × 64 KiB per file.
+    """
+    try:
+        sa, sb = a.stat(), b.stat()
+    except OSError:
+        return False
+    if (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino):
+        return True
+    if sa.st_size != sb.st_size or not sa.st_size:
+        return False
+    try:
+        return (head_tail_digests(str(a), sa.st_size)[0]
+                == head_tail_digests(str(b), sb.st_size)[0])
+    except OSError:
+        return False
+
+
+def _full(path: Path, store: FingerprintStore | None) -> str:
+    st = path.stat()
+    key = store_key(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    digest = store.get(key).get("full") if store is not None else None
+    if digest is None:
+        digest = full_digest(str(path))
+        if store is not None:
+            store.update(key, full=digest)
+    return digest
+
+
+def identical(a: Path, b: Path, store: FingerprintStore | None = None) -> bool:
+    """
+    `same_content`, confirmed by whole-file digests (cached in *store*)
+    when the head/tail sample did not cover every byte - a preallocated
+    or partial target can share its first and last blocks with the real
+    file. Good enough to delete one of the two on.
+    """
+    if not same_content(a, b):
+        return False
+    try:
+        size = a.stat().st_size
+        return covers_whole_file(size) or _full(a, store) == _full(b, store)
+    except OSError:
+        return False
+
+
+def _place(file_path: Path, destination: Path, verify: bool = False,
+           store: FingerprintStore | None = None, link: str | None = None,
+           stats: transfer.MoveStats | None = None) -> tuple[Path, bool]:
+    """
+    Move *file_path* into *destination* without ever overwriting. Returns
+    ``(path, True)`` with the new path, or ``(existing, False)`` when
+    nothing was placed: the source already is *existing* (or a hardlink
+    to it) and is left alone, or *existing* is an identical copy and the
+    source was deleted. *verify*/*store*
+    go to `transfer.move_file`; with a *link* mode the file goes through
+    `transfer.link_file` instead and the source is never removed. The
+    method used and the bytes placed are tallied in *stats*.
+
+    A name is only taken by the complete file, with a no-replace rename;
+    if it was taken meanwhile, the finished copy moves on to the next one.
+    """
+    target = destination / file_path.name
+    n = 0
+    while True:
+        if os.path.lexists(target):
+            if _same_inode(file_path, target):  # DST inside SRC, or move X X
+                log.info("%s is already in %s - leaving it", file_path, destination)
+                return target, False
+            if link and same_content(file_path, target):
+                log.info("Identical copy already at %s", target)
+                return target, False
+            if not link and identical(file_path, target, store):
+                log.info("Identical copy already at %s - removing %s", target, file_path)
+                file_path.unlink()
+                return target, False
+            n += 1
+            target = destination / _dup_name(file_path.name, n)
+            continue
+        if n:
+            log.info("Duplicate name - moving to %s", target)
+        try:
+            if link:
+                how = transfer.link_file(file_path, target, link, verify, store,
+                                         replace=False)
+            else:
+                how = transfer.move_file(file_path, target, verify, store, replace=False)
+        except FileExistsError:                 # taken meanwhile: compare with it
+            continue
+        break
+    if stats is not None:
+        stats.add(how, target.stat().st_size)
+    return target, True
+
+
+# ─────────────────────────── sidecars ─────────────────────────────────
+def _carry(sidecars: Sequence[Path], video: Path, target: Path,
+           link: str | None = None) -> None:
+    """
+    Bring *video*'s sidecars next to its new path *target*, renamed to
+    match (see `sidecar.renamed`). Like videos they never overwrite: a
+    name that is taken keeps the sidecar where it is, unless it is an
+    identical copy. Their bytes are not part of a job's progress.
+    """
+    with transfer.unreported():
+        for sc in sidecars:
+            dst = target.with_name(sidecar.renamed(sc.name, video.stem, target.stem))
+            if dst == sc:
+                continue
+            try:
+                if os.path.lexists(dst):
+                    raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(dst))
+                if link:
+                    transfer.link_file(sc, dst, link, replace=False)
+                else:
+                    transfer.move_file(sc, dst, replace=False)
+            except FileExistsError:
+                transfer.discard_partial(sc, dst.parent)
+                if _same_inode(sc, dst):
+                    continue
+                if identical(sc, dst):
+                    if not link:
+                        sc.unlink()
+                else:
+                    log.warning("%s already exists - leaving %s", dst.name, sc)
+            except OSError as exc:
+                log.warning("Could not carry %s along: %s", sc, exc)
+
+
+def _sidecars_of(videos: Sequence[Path], files: Sequence[Path]) -> dict[Path, List[Path]]:
+    """
+    Sidecars of each of *videos*, matched among the other *files* of the
+    same directory; a directory for which *files* holds no sidecar names
+    (e.g. only the videos were passed) is listed once instead.
+    """
+    listed: dict[Path, List[str]] = {}
+    for f in files:
+        listed.setdefault(f.parent, []).append(f.name)
+    out: dict[Path, List[Path]] = {}
+    for parent in dict.fromkeys(v.parent for v in videos):
+        names = listed.get(parent, [])
+        if not any(sidecar.is_sidecar_name(n) for n in names):
+            try:
+                names = os.listdir(parent)
+            except OSError:
+                pass
+        in_dir = [n for n in names if os.path.splitext(n)[1].lower() in VIDEO_EXTS]
+        owned = sidecar.match(in_dir, names)
+        for v in videos:
+            if v.parent == parent:
+                out[v] = [parent / n for n in owned.get(v.name, [])]
+    return out
+
+
+# ─────────────────────────── quality policy ───────────────────────────
+def title_key(path: Path) -> str | None:
+    """Case-folded “Title_(YEAR)” a file cleans to, or None without a year."""
+    stem = build_clean_name(path).stem
+    return stem.casefold() if READY_PATTERN.search(stem) else None
+
+
+def _archive(loser: Path, archive_dir: Path, sidecars: Sequence[Path] = ()) -> None:
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    log.info("Archiving lower-quality %s → %s", loser.name, archive_dir)
+    with transfer.unreported():                 # not part of any job's size
+        target, _placed = _place(loser, archive_dir)
+    _carry(sidecars, loser, target)
+
+
+def keep_best(files: Iterable[Path], archive_dir: Path | None = None,
+              sidecars: Mapping[Path, Sequence[Path]] | None = None) -> List[Path]:
+    """
+    Among *files* that clean to the same Title_(YEAR), keep the best by
+    `quality.quality` and move the rest (with their *sidecars*) to
+    *archive_dir* (default: a “.superseded” folder beside each loser).
+    Files that cannot be ranked are never archived. Returns the survivors.
+    """
+    groups: dict[str | None, List[Path]] = {}
+    survivors: List[Path] = []
+    for f in files:
+        key = title_key(f)
+        if key is None:
+            survivors.append(f)
+        else:
+            groups.setdefault(key, []).append(f)
+    for group in groups.values():
+        if len(group) == 1:
+            survivors.extend(group)
+            continue
+        ranked = {f: quality.quality(f) for f in group}
+        survivors.extend(f for f in group if ranked[f] is None)
+        known = [f for f in group if ranked[f] is not None]
+        if not known:
+            continue
+        best = max(known, key=ranked.__getitem__)      # ties keep the first
+        for f in known:
+            if f != best:
+                _archive(f, archive_dir or f.parent / SUPERSEDED_DIR,
+                         (sidecars or {}).get(f, ()))
+        survivors.append(best)
+    return survivors
+
+
 # ─────────────────────────── bulk actions ─────────────────────────────
-def move_files_to_folder(files: Iterable[Path], destination: Path) -> None:
+def _size(path: Path, sizes: Mapping[Path, int] | None) -> int:
+    if sizes is not None and path in sizes:
+        return sizes[path]
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def move_files_to_folder(files: Iterable[Path], destination: Path | Sequence[Path],
+                         prefer_quality: bool = False,
+                         archive_dir: Path | None = None,
+                         verify: bool = False, jobs: int = 1,
+                         link: str | None = None,
+                         sizes: Mapping[Path, int] | None = None,
+                         stats: transfer.MoveStats | None = None,
+                         sidecars: Mapping[Path, Sequence[Path]] | None = None) -> List[Path]:
+    """
+    Move *files* (with their *sidecars*) into *destination*, or spread them
+    over several library roots with `placement.plan`. Returns the new paths.
+    Each file goes through `_place`; with *prefer_quality* the loser of a
+    title goes to *archive_dir* (see `keep_best`), and a library file only
+    once its winner is in place. Moves run through `schedule.run`.
     """
-    Move *files* into *destination* (non-recursive). Duplicates are
-    prefixed with “[DUP] ”.
+    roots = [destination] if isinstance(destination, Path) else list(destination)
+    for root in roots:
+        root.mkdir(parents=True, exist_ok=True)
+        transfer.sweep_partials(root)
+    library: dict[str, Path] = {}
+    if prefer_quality or len(roots) > 1:
+        for root in roots:
+            for p in sorted(root.iterdir()):
+                key = title_key(p) if p.suffix.lower() in VIDEO_EXTS and p.is_file() else None
+                if key is not None:
+                    library.setdefault(key, p)
+    existing = {key: p.parent for key, p in library.items()}
+
+    def archive_for(rival: Path) -> Path:
+        """Where losers of *rival*'s title are parked."""
+        home = rival.parent if rival.parent in roots else roots[0]
+        return archive_dir or home / SUPERSEDED_DIR
+
+    sidecars = sidecars or {}
+
+    def drop_source(loser: Path, rival: Path) -> None:
+        if link:
+            log.info("Skipping lower-quality %s", loser)
+        else:
+            _archive(loser, archive_for(rival), sidecars.get(loser, ()))
+
+    # decide serially (cheap header reads), then move in parallel; a
+    # library file that lost is only archived once its winner is in place
+    pending: dict[Path, None] = {}
+    displaced: dict[Path, Path] = {}            # winning source → library file
+    for file_path in files:
+        key = title_key(file_path) if prefer_quality else None
+        current = library.get(key) if key is not None else None
+        if current is not None and current.exists():
+            winner = quality.better(current, file_path)
+            if winner is None:                  # unrankable: plain [DUP] handling
+                pending[file_path] = None
+                continue
+            if winner == current:
+                drop_source(file_path, current)
+                continue
+            if current in pending:              # an earlier source lost
+                del pending[current]
+                drop_source(current, current)
+                if current in displaced:
+                    displaced[file_path] = displaced.pop(current)
+            else:
+                displaced[file_path] = current
+        pending[file_path] = None
+        if key is not None:
+            library[key] = file_path
+
+    size_of = {f: _size(f, sizes) for f in pending}
+    if len(roots) == 1:
+        targets = dict.fromkeys(pending, roots[0])
+    else:
+        targets = placement.plan(list(pending), roots, size_of,
+                                 key=title_key, existing=existing)
+    work = [(f, targets[f]) for f in pending if f in targets]
+
+    store = FingerprintStore()                  # digests for --verify and dedupe
+
+    def place(file_path: Path, dst_dir: Path) -> Path | None:
+        try:
+            target, placed = _place(file_path, dst_dir, verify, store, link, stats)
+        except OSError as exc:
+            if exc.errno != errno.EIO:
+                raise
+            log.error("Copy of %s failed its check - source kept: %s", file_path, exc)
+            return None
+        if placed:
+            loser = displaced.get(file_path)
+            if loser is not None and loser.exists():
+                _archive(loser, archive_for(loser), _sidecars_of([loser], [])[loser])
+                wanted = dst_dir / file_path.name
+                if target != wanted and loser == wanted:    # landed on [DUP] of it
+                    try:
+                        transfer.rename_noreplace(target, wanted)
+                        target = wanted
+                    except OSError as exc:
+                        log.warning("Could not rename %s to %s: %s",
+                                    target.name, wanted.name, exc)
+        # also next to an identical copy that was already there
+        _carry(sidecars.get(file_path, ()), file_path, target, link)
+        return target if placed else None
+
+    try:
+        results = schedule.run(work, place, per_pair=jobs,
+                               sizes=[size_of[f] for f, _root in work])
+    finally:
+        store.save()
+    return [t for t in results if t is not None]
+
+
+# ─────────────────────────── rename plans ─────────────────────────────
+PLAN_VERSION = 1
+
+
+def plan_renames(files: Iterable[Path]) -> dict:
+    """
+    Phase one of a batch clean-up: the `build_clean_name` result for every
+    video in *files* (plus its sidecars), computed without touching disk
+    beyond existence checks. Returns a JSON-ready dict::
+
+        {"version": 1,
+         "renames":   [{"src", "dst", "sidecars": [{"src", "dst"}, …]}, …],
+         "conflicts": [{"src", "dst", "reason"}, …]}
+
+    A target claimed by two sources goes to the first (by path); a target
+    that exists and is not itself being renamed away is a conflict too.
+    Chains and cycles (A → B while B → C or B → A) are kept - `apply_plan`
+    orders them. A video in conflict keeps its name and so do its sidecars.
+    """
+    files = [f.absolute() for f in files]       # the plan may be applied elsewhere
+    videos = sorted(f for f in files if f.suffix.lower() in VIDEO_EXTS)
+    sidecars = _sidecars_of(videos, files)
+
+    # (src, dst, owning video src or None)
+    nodes: List[tuple[Path, Path, Path | None]] = []
+    for v in videos:
+        dst = build_clean_name(v)
+        if dst != v:
+            nodes.append((v, dst, None))
+        for sc in sidecars.get(v, []):
+            sc_dst = v.with_name(sidecar.renamed(sc.name, v.stem, dst.stem))
+            if sc_dst != sc:
+                nodes.append((sc, sc_dst, v))
+
+    conflicts: List[dict] = []
+    rejected: set[Path] = set()                 # videos that keep their name
+
+    def reject(node: tuple[Path, Path, Path | None], reason: str) -> None:
+        log.warning("Not renaming %s → %s: %s", node[0].name, node[1].name, reason)
+        conflicts.append({"src": str(node[0]), "dst": str(node[1]), "reason": reason})
+        if node[2] is None:
+            rejected.add(node[0])
+
+    claimed: dict[Path, Path] = {}
+    kept = []
+    for node in nodes:
+        if node[1] in claimed:
+            reject(node, f"same target as {claimed[node[1]].name}")
+        else:
+            claimed[node[1]] = node[0]
+            kept.append(node)
+
+    # drop renames whose target stays occupied, until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        moving = {src for src, _dst, _video in kept}
+        for node in list(kept):
+            src, dst, video = node
+            if video is not None and video in rejected:
+                blocked = "its video keeps its name"
+            elif (dst not in moving and os.path.lexists(dst)
+                  and not os.path.samefile(src, dst)):
+                blocked = "target exists"
+            else:
+                continue
+            kept.remove(node)
+            reject(node, blocked)
+            changed = True
+
+    renames = []
+    units: dict[Path, dict] = {}
+    for src, dst, video in kept:
+        if video is None:
+            units[src] = {"src": str(src), "dst": str(dst), "sidecars": []}
+            renames.append(units[src])
+    for src, dst, video in kept:
+        if video is not None:
+            if video not in units:                  # video already clean
+                units[video] = {"src": str(video), "dst": str(video), "sidecars": []}
+                renames.append(units[video])
+            units[video]["sidecars"].append({"src": str(src), "dst": str(dst)})
+    return {"version": PLAN_VERSION, "renames": renames, "conflicts": conflicts}
+
+
+def _components(steps: List[dict]) -> List[List[dict]]:
+    """
+    Split rename steps into independent groups: a step joins the group of
+    the step that must vacate its target first, and of its video.
+    """
+    parent = list(range(len(steps)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    by_src = {st["src"]: i for i, st in enumerate(steps)}
+    for i, st in enumerate(steps):
+        for j in (by_src.get(st["dst"]), by_src.get(st.get("video"))):
+            if j is not None:
+                parent[find(i)] = find(j)
+    groups: dict[int, List[dict]] = {}
+    for i, st in enumerate(steps):
+        groups.setdefault(find(i), []).append(st)
+    return list(groups.values())
+
+
+def _run_component(steps: List[dict]) -> dict[str, str]:
+    """
+    Execute one group of dependent renames without ever replacing a file.
+    Ready steps (target free) go first, videos before sidecars; a cycle is
+    broken by parking one source under a temporary name. Returns
+    ``{video src: final path}`` for the videos of the group.
+    """
+    pending = [dict(st) for st in steps]
+    done: dict[str, str] = {}
+    failed: set[str] = set()
+    while pending:
+        pending = [st for st in pending if st.get("video") not in failed]
+        if not pending:
+            break
+        sources = {st["src"] for st in pending}
+        waiting = {st.get("orig", st["src"]) for st in pending if "video" not in st}
+        free = [st for st in pending if st.get("video") not in waiting]
+        ready = [st for st in free if st["dst"] not in sources]
+        if not ready:                                   # a cycle: park one source
+            st = next((s for s in free if "video" not in s), free[0])
+            tmp = Path(st["src"]).with_name(f".{Path(st['src']).name}.zelswap")
+            transfer.rename_noreplace(Path(st["src"]), tmp)
+            st.setdefault("orig", st["src"])
+            st["src"] = str(tmp)
+            continue
+        st = next((s for s in ready if "video" not in s), ready[0])
+        pending.remove(st)
+        orig = st.get("orig", st["src"])
+        try:
+            transfer.rename_noreplace(Path(st["src"]), Path(st["dst"]))
+        except OSError as exc:
+            log.warning("Could not rename %s → %s: %s", orig, Path(st["dst"]).name, exc)
+            if "video" not in st:
+                failed.add(orig)
+            if st["src"] != orig:                       # un-park
+                try:
+                    transfer.rename_noreplace(Path(st["src"]), Path(orig))
+                except OSError:
+                    log.error("%s left parked as %s", orig, st["src"])
+            continue
+        if "video" not in st:
+            done[orig] = st["dst"]
+    return done
+
+
+def apply_plan(plan: dict, workers: int = 1) -> dict[Path, Path]:
+    """
+    Phase two: execute a `plan_renames` plan (possibly loaded from JSON)
+    with no-replace renames (`transfer.rename_noreplace`). Independent
+    chains run on *workers* threads, which helps on slow network shares.
+    Returns ``{old path: new path}`` for the videos actually renamed; a
+    video whose rename fails (or whose source is gone) is left out, keeps
+    its name, and its sidecars stay as they were.
     """
-    destination.mkdir(parents=True, exist_ok=True)
-    for file_path in tqdm(files, desc="Moving files", unit="file"):
-        target = destination / file_path.name
-        if target.exists():
-            dup_target = destination / f"[DUP] {file_path.name}"
-            log.info("Duplicate detected - moving to %s", dup_target)
-            shutil.move(file_path, dup_target)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"unsupported plan version {plan.get('version')!r}")
+    steps: List[dict] = []
+    for unit in plan["renames"]:
+        if unit["dst"] != unit["src"]:
+            steps.append({"src": unit["src"], "dst": unit["dst"]})
+        for sc in unit.get("sidecars", []):
+            steps.append({"src": sc["src"], "dst": sc["dst"], "video": unit["src"]})
+    groups = _components(steps)
+
+    done: dict[str, str] = {}
+    with tqdm(total=len(groups), desc="Renaming", unit="group") as bar:
+        if workers > 1 and len(groups) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zelrename") as pool:
+                for result in pool.map(_run_component, groups):
+                    done.update(result)
+                    bar.update(1)
         else:
-            shutil.move(file_path, target)
+            for group in groups:
+                done.update(_run_component(group))
+                bar.update(1)
+    return {Path(src): Path(dst) for src, dst in done.items()}
 
 
-def clean_movie_names(folder: Path) -> None:
+def clean_files(files: Iterable[Path], prefer_quality: bool = False,
+                archive_dir: Path | None = None, workers: int = 1) -> List[Path]:
+    """
+    Rename each video in *files* in place using `build_clean_name`, its
+    subtitles/.nfo/artwork along with it (see `sidecar`): the whole batch
+    is planned first (`plan_renames`), then applied (`apply_plan`), so
+    two releases that clean to the same name never overwrite each other.
+    With *prefer_quality*, versions that clean to the same Title_(YEAR)
+    are first reduced to the best one (see `keep_best`).
+    Returns the resulting paths.
+    """
+    files = list(files)
+    videos = [f for f in files if f.suffix.lower() in VIDEO_EXTS]
+    if prefer_quality:
+        keep_best(videos, archive_dir, _sidecars_of(videos, files))
+        files = [f for f in files if f.exists()]        # losers were archived
+        videos = [f for f in files if f.suffix.lower() in VIDEO_EXTS]
+    renamed = apply_plan(plan_renames(files), workers)
+    return [renamed.get(v.absolute(), v) for v in videos]
+
+
+def clean_movie_names(folder: Path, prefer_quality: bool = False,
+                      archive_dir: Path | None = None, workers: int = 1) -> None:
     """
     Rename every video file in *folder* in place using `build_clean_name`.
     """
     log.info("Cleaning movie names…")
-    for file_path in tqdm(list(folder.iterdir()), desc="Renaming", unit="file"):
-        if file_path.suffix.lower() not in VIDEO_EXTS:
-            continue
-        new_path = build_clean_name(file_path)
-        if new_path.name != file_path.name:
-            log.debug("%s → %s", file_path.name, new_path.name)
-            file_path.rename(new_path)
+    clean_files(folder.iterdir(), prefer_quality, archive_dir, workers)
 
 
 # ─────────────────────────── series renaming ─────────────────────────────
@@ -261,6 +793,78 @@ TEST_CASES: list[tuple[str, str]] = [
     ("Just_1.mp4", "Just.mp4"),
 ]
 
+
+def _check_cases() -> list[tuple[str, object, object]]:
+    """(label, got, expected) for sidecars, ignore rules, plans and `_place`."""
+    cases: list[tuple[str, object, object]] = []
+
+    def add(label: str, got: object, expected: object) -> None:
+        cases.append((label, got, expected))
+
+    # sidecar ownership: longest stem wins, folder art only with one video
+    owned = sidecar.match(["Film.mkv", "Film.Extended.mkv"],
+                          ["Film.en.srt", "Film.Extended.en.srt", "poster.jpg", "notes.txt"])
+    add("match: by stem", owned["Film.mkv"], ["Film.en.srt"])
+    add("match: longest stem", owned["Film.Extended.mkv"], ["Film.Extended.en.srt"])
+    add("match: folder art alone", sidecar.match(["Film.mkv"], ["poster.jpg"]),
+        {"Film.mkv": ["poster.jpg"]})
+    add("renamed: keeps suffix", sidecar.renamed("Film.en.srt", "Film", "Film_(2001)"),
+        "Film_(2001).en.srt")
+    add("renamed: nfo", sidecar.renamed("movie.nfo", "Film", "Film_(2001)"), "Film_(2001).nfo")
+    add("renamed: art", sidecar.renamed("poster.jpg", "Film", "Film_(2001)"),
+        "Film_(2001)-poster.jpg")
+
+    # ignore rules: dir-only, negation (last match wins), anchoring
+    rules = IgnoreRules(["Sample/", "*.nfo", "!keep.nfo", "/top"])
+    add("ignore: dir-only dir", rules.hides("a/Sample/x.mkv"), True)
+    add("ignore: dir-only file", rules.hides("a/Sample"), False)
+    add("ignore: glob", rules.hides("a/b.nfo"), True)
+    add("ignore: negated", rules.hides("a/keep.nfo"), False)
+    add("ignore: anchored", (rules.hides("top"), rules.hides("a/top")), (True, False))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+
+        # plans: shared target, occupied target, sidecars follow their video
+        for name in ("Film.2001.mkv", "Film-2001.mkv", "Film-2001.en.srt",
+                     "Taken.2002.mkv", "Taken_(2002).mkv"):
+            (root / name).write_text(name)
+        plan = plan_renames(root.iterdir())
+        add("plan: renames", sorted(Path(u["dst"]).name for u in plan["renames"]),
+            ["Film_(2001).mkv"])
+        add("plan: sidecar", [Path(sc["dst"]).name for u in plan["renames"] for sc in u["sidecars"]],
+            ["Film_(2001).en.srt"])
+        add("plan: conflicts", sorted(c["reason"] for c in plan["conflicts"]),
+            ["same target as Film-2001.mkv", "target exists"])
+        apply_plan(plan)
+        add("plan: applied", (root / "Film_(2001).en.srt").read_text(), "Film-2001.en.srt")
+
+        # a swap (A → B, B → A) goes through a temporary name
+        a, b = root / "a.mkv", root / "b.mkv"
+        a.write_text("a")
+        b.write_text("b")
+        apply_plan({"version": PLAN_VERSION, "conflicts": [], "renames": [
+            {"src": str(a), "dst": str(b), "sidecars": []},
+            {"src": str(b), "dst": str(a), "sidecars": []}]})
+        add("plan: cycle", (a.read_text(), b.read_text()), ("b", "a"))
+
+        # _place: identical source is dropped, a hardlink is left, others get [DUP]
+        src, lib = root / "src", root / "lib"
+        src.mkdir()
+        lib.mkdir()
+        (lib / "M.mkv").write_text("same")
+        (src / "M.mkv").write_text("same")
+        add("place: identical", (_place(src / "M.mkv", lib), (src / "M.mkv").exists()),
+            ((lib / "M.mkv", False), False))
+        os.link(lib / "M.mkv", src / "M.mkv")
+        add("place: same inode", (_place(src / "M.mkv", lib), (src / "M.mkv").exists()),
+            ((lib / "M.mkv", False), True))
+        (src / "M.mkv").unlink()
+        (src / "M.mkv").write_text("different")
+        add("place: different", _place(src / "M.mkv", lib), (lib / "[DUP] M.mkv", True))
+    return cases
+
+
 def _run_self_test() -> None:
     print("Self-test: build_clean_name\n")
     width = max(len(inp) for inp, _ in TEST_CASES)
@@ -273,7 +877,16 @@ def _run_self_test() -> None:
         if not ok:
             print(f"      expected: {expected}")
             failed += 1
-    total = len(TEST_CASES)
+    cases = _check_cases()
+    print("\nSelf-test: sidecars, ignore rules, rename plans, _place\n")
+    width = max(len(label) for label, _, _ in cases)
+    for label, got, expected in cases:
+        ok = (got == expected)
+        print(f"{'OK  ' if ok else 'FAIL'}  {label:<{width}}  →  {got}")
+        if not ok:
+            print(f"      expected: {expected}")
+            failed += 1
+    total = len(TEST_CASES) + len(cases)
     print(f"\nSummary: {total - failed} passed, {failed} failed, {total} total.")
     raise SystemExit(1 if failed else 0)
 
@@ -1,34 +1,493 @@
 """
 Functions for discovering movie files and parsing basic fields.
 """
+from __future__ import annotations
+
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .constants import MOVIE_RE, NON_VIDEO_EXTS, PARTIAL_SUFFIXES, VIDEO_EXTS
+from . import sidecar
+from .detect import classify_many, save_cache
+from .fingerprint import FingerprintStore, full_digest, head_tail_digests, store_key
+from .ignore import IgnoreRules, load_rules, relative
+from .index import DirRecord, FileRow, LibraryIndex
+
+log = logging.getLogger(__name__)
+
+_VIDEO_EXTS = frozenset(ext.lower() for ext in VIDEO_EXTS)
+
+
+class FileInfo(NamedTuple):
+    """One video file as seen by the walker (stat data and sidecar paths included)."""
+    path: str
+    size: int
+    mtime_ns: int
+    dev: int
+    ino: int
+    sidecars: Tuple[str, ...] = ()
+
+
+# ─────────────────────────── walk engine ──────────────────────────────
+def is_video_name(name: str) -> bool:
+    """True if *name* ends in one of VIDEO_EXTS (case-insensitive)."""
+    return os.path.splitext(name)[1].lower() in _VIDEO_EXTS
+
+
+def _read_dir(path: str, rec: Optional[DirRecord] = None) -> Iterator[FileRow]:
+    """
+    Read *path* once with ``os.scandir`` and yield a
+    ``[name, size, mtime_ns, dev, ino]`` row for each video as it is read,
+    in directory order. With *rec*, every entry is also filed into its
+    `DirRecord` list.
+
+    Directory/file type comes from the DirEntry cache; only the video
+    files themselves are stat'ed. "Other" files are those whose extension
+    is not known to be non-video, kept by name for ``detect`` mode.
+    Sidecars are subtitles/.nfo/artwork that may travel with a video.
+    Unreadable directories are skipped.
+    """
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rec is not None:
+                            rec.subdirs.append(entry.name)
+                    elif entry.is_symlink() and entry.is_dir():
+                        if rec is not None:
+                            rec.linked.append(entry.name)
+                    elif is_video_name(entry.name) and entry.is_file():
+                        st = entry.stat()
+                        row = [entry.name, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino]
+                        if rec is not None:
+                            rec.files.append(row)
+                        yield row
+                    elif rec is None:
+                        continue
+                    elif (os.path.splitext(entry.name)[1].lower() not in NON_VIDEO_EXTS
+                          and entry.is_file()):
+                        rec.others.append(entry.name)
+                    elif sidecar.is_sidecar_name(entry.name) and entry.is_file():
+                        rec.sidecars.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        pass
+
+
+def _scan_dir(path: str) -> DirRecord:
+    """The full `_read_dir` listing of *path*, each part sorted by name."""
+    rec = DirRecord([], [], [], [], [])
+    for _row in _read_dir(path, rec):
+        pass
+    for part in rec:
+        part.sort()
+    return rec
+
+
+def _visit(directory: str,
+           index: Optional[LibraryIndex]) -> Optional[Tuple[Tuple[int, int], DirRecord]]:
+    """
+    ``((st_dev, st_ino), listing)`` for *directory*; the listing is served
+    from *index* when the directory's mtime is unchanged.
+    """
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return None
+    rec = index.lookup(directory, st.st_mtime_ns) if index is not None else None
+    if rec is None:
+        rec = _scan_dir(directory)
+        if index is not None:
+            index.store(directory, st.st_mtime_ns, rec)
+    return (st.st_dev, st.st_ino), rec
 
-from .constants import MOVIE_RE, VIDEO_EXTS
+
+class _Walker:
+    """Walk configuration shared by the serial and pooled traversals."""
+
+    def __init__(self, root: str, index: Optional[LibraryIndex],
+                 follow_symlinks: bool, rules: Optional[IgnoreRules],
+                 detect: bool = False, settle: float = 0.0) -> None:
+        self.root = root
+        self.index = index
+        self.follow_symlinks = follow_symlinks
+        self.rules = rules or None
+        # rules loaded for a folder above *root* stay relative to that folder
+        self.base = rules.root if rules is not None and rules.root else root
+        self.detect = detect
+        self.settle_ns = int(settle * 1e9)
+        self.seen_dirs: Set[Tuple[int, int]] = set()
+
+    def enter(self, directory: str, dir_id: Tuple[int, int]) -> bool:
+        """False if *directory* was already walked (symlink loop or bind mount)."""
+        if dir_id in self.seen_dirs:
+            log.debug("Skipping already visited directory %s", directory)
+            return False
+        self.seen_dirs.add(dir_id)
+        return True
+
+    def children(self, directory: str, rec: DirRecord) -> List[str]:
+        names = (sorted(rec.subdirs + rec.linked) if self.follow_symlinks and rec.linked
+                 else rec.subdirs)
+        paths = [os.path.join(directory, d) for d in names]
+        if self.rules:
+            paths = [p for p in paths
+                     if not self.rules.excluded(relative(self.base, p), is_dir=True)]
+        return paths
+
+    def _included(self, path: str) -> bool:
+        return not (self.rules and self.rules.excluded(relative(self.base, path), is_dir=False))
+
+    def emit(self, directory: str, rec: DirRecord) -> Iterator[FileInfo]:
+        found: List[FileInfo] = []
+        for name, size, mtime, dev, ino in rec.files:
+            path = os.path.join(directory, name)
+            if self._included(path):
+                found.append(FileInfo(path, size, mtime, dev, ino))
+        if self.detect and rec.others:
+            # "x.mkv.part" sniffs as matroska, but it is a download in flight
+            others = [p for p in (os.path.join(directory, n) for n in rec.others
+                                  if not n.lower().endswith(PARTIAL_SUFFIXES))
+                      if self._included(p)]
+            for path, (kind, st) in zip(others, classify_many(others)):
+                if kind is not None:
+                    found.append(FileInfo(path, st.st_size, st.st_mtime_ns,
+                                          st.st_dev, st.st_ino))
+            found.sort()
+        if rec.sidecars and found:
+            names = [n for n in rec.sidecars if self._included(os.path.join(directory, n))]
+            owned = sidecar.match([os.path.basename(f.path) for f in found], names)
+            found = [f._replace(sidecars=tuple(os.path.join(directory, n)
+                                               for n in owned[os.path.basename(f.path)]))
+                     for f in found]
+        if self.settle_ns:
+            found = self._settled(directory, rec, found)
+        yield from found
+
+    def _settled(self, directory: str, rec: DirRecord,
+                 found: List[FileInfo]) -> List[FileInfo]:
+        """
+        Drop files that may still be downloading: those with a partial
+        sibling, and those modified within the settle window. A row whose
+        mtime was already older than the window when its directory was
+        listed is trusted as is; only the others are stat'ed again.
+        """
+        now = time.time_ns()
+        listed = self.index.scanned(directory) if self.index is not None else now
+        proven = (listed or 0) - self.settle_ns
+        partial = {n.lower() for n in rec.others if n.lower().endswith(PARTIAL_SUFFIXES)}
+        kept: List[FileInfo] = []
+        for f in found:
+            name = os.path.basename(f.path).lower()
+            if name.endswith(PARTIAL_SUFFIXES) or any(name + s in partial
+                                                      for s in PARTIAL_SUFFIXES):
+                log.info("Skipping %s - download still in progress", f.path)
+                continue
+            if f.mtime_ns > proven:
+                try:
+                    st = os.stat(f.path)
+                except OSError:
+                    continue
+                if st.st_mtime_ns > now - self.settle_ns:
+                    log.info("Skipping %s - modified in the last %.0fs",
+                             f.path, self.settle_ns / 1e9)
+                    continue
+                f = FileInfo(f.path, st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+            kept.append(f)
+        return kept
+
+    def serial(self, recursive: bool) -> Iterator[FileInfo]:
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            got = _visit(directory, self.index)
+            if got is None or not self.enter(directory, got[0]):
+                continue
+            rec = got[1]
+            yield from self.emit(directory, rec)
+            if recursive:
+                stack.extend(reversed(self.children(directory, rec)))
+
+    def pooled(self, workers: int) -> Iterator[FileInfo]:
+        """
+        Same order as `serial`, but every sub-directory is submitted to
+        the pool as soon as its parent is listed, so slow ``stat``/``readdir``
+        round-trips on network mounts overlap instead of queueing up.
+        """
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zelscan") as pool:
+            def descend(directory: str, fut: Future) -> Iterator[FileInfo]:
+                got = fut.result()
+                if got is None or not self.enter(directory, got[0]):
+                    return
+                rec = got[1]
+                children = self.children(directory, rec)
+                futures = [pool.submit(_visit, c, self.index) for c in children]
+                yield from self.emit(directory, rec)
+                for child, child_fut in zip(children, futures):
+                    yield from descend(child, child_fut)
+
+            yield from descend(self.root, pool.submit(_visit, self.root, self.index))
+
+
+def _walk(root: str, recursive: bool, index: Optional[LibraryIndex],
+          workers: int = 1, follow_symlinks: bool = False,
+          rules: Optional[IgnoreRules] = None, detect: bool = False,
+          settle: float = 0.0) -> Iterator[FileInfo]:
+    """
+    Yield every video under *root*, top-down in name order. With an
+    *index*, directories whose mtime is unchanged are served from it
+    instead of being re-read. Sub-directories excluded by *rules* are
+    dropped before they are read. With *detect*, files of unknown type
+    are included when their first bytes carry a video container signature.
+    With *settle*, files that look like in-flight downloads are left out
+    (see `_Walker._settled`).
+
+    Each physical file is yielded once: hardlinks, symlinked files and
+    bind-mounted copies are dropped by ``(st_dev, st_ino)`` taken from the
+    stat the walk already did, and directories are never entered twice.
+    """
+    w = _Walker(root, index, follow_symlinks, rules, detect=detect, settle=settle)
+    walker = w.pooled(workers) if recursive and workers > 1 else w.serial(recursive)
+
+    seen_files: Set[Tuple[int, int]] = set()
+    complete = False
+    try:
+        for info in walker:
+            key = (info.dev, info.ino)
+            if key in seen_files:
+                log.debug("Skipping second link to %s", info.path)
+                continue
+            seen_files.add(key)
+            yield info
+        complete = True
+    finally:
+        walker.close()
+        if index is not None:
+            if complete and recursive:
+                index.prune(root)
+            index.save()
+        if detect:
+            save_cache()
 
 
-def list_movies(root: str | Path = ".") -> List[Dict]:
+def _iter_flat(root: str, index: Optional[LibraryIndex],
+               rules: Optional[IgnoreRules]) -> Iterator[FileInfo]:
+    """
+    Videos directly in *root*, yielded while the directory is still being
+    read (in directory order) when its listing is not cached; a cached
+    listing is replayed in name order. Without an *index* nothing is kept
+    but the inodes already yielded, so huge flat libraries stream in
+    constant memory. No sidecars, detection or settle filtering.
+    """
+    try:
+        st = os.stat(root)
+    except OSError:
+        return
+    rec = index.lookup(root, st.st_mtime_ns) if index is not None else None
+    fresh: Optional[DirRecord] = None
+    if rec is not None:
+        rows: Iterable[FileRow] = rec.files
+    else:
+        fresh = DirRecord([], [], [], [], []) if index is not None else None
+        rows = _read_dir(root, fresh)
+    seen: Set[Tuple[int, int]] = set()
+    complete = False
+    try:
+        for name, size, mtime, dev, ino in rows:
+            path = os.path.join(root, name)
+            if rules and rules.excluded(relative(root, path), is_dir=False):
+                continue
+            if (dev, ino) in seen:
+                log.debug("Skipping second link to %s", path)
+                continue
+            seen.add((dev, ino))
+            yield FileInfo(path, size, mtime, dev, ino)
+        complete = True
+    finally:
+        if fresh is not None and complete:
+            for part in fresh:
+                part.sort()
+            index.store(root, st.st_mtime_ns, fresh)
+        if index is not None:
+            index.save()
+
+
+def iter_files(root: str | Path, recursive: bool = True, use_index: bool = True,
+               workers: int = 1, follow_symlinks: bool = False,
+               exclude: Iterable[str] = (), detect: bool = False,
+               settle: float = 0.0, rules: Optional[IgnoreRules] = None) -> Iterator[FileInfo]:
+    """
+    Yield a FileInfo for every video under *root*. ``workers > 1`` walks
+    sub-directories on a thread pool; the output order is unchanged.
+    ``follow_symlinks`` also descends into symlinked directories.
+    ``root/.zelignore`` and *exclude* patterns prune matching paths, or
+    *rules* already loaded for *root* or a folder above it.
+    ``detect`` also sniffs files with unknown/misleading extensions.
+    ``settle`` (seconds) skips files modified that recently or sitting
+    next to a ``.part``/``.!qB`` file, i.e. downloads still in flight.
+    """
+    root = os.path.realpath(root)
+    index = LibraryIndex() if use_index else None
+    if rules is None:
+        rules = load_rules(root, exclude)
+    return _walk(root, recursive, index, workers, follow_symlinks, rules, detect, settle)
+
+
+# ─────────────────────────── movie records ────────────────────────────
+class Movie:
+    """Compact record for one parsed ``Title_(YEAR).ext`` file."""
+
+    __slots__ = ("title", "year", "path", "size", "mtime_ns")
+
+    def __init__(self, title: str, year: int, path: str,
+                 size: Optional[int] = None, mtime_ns: Optional[int] = None) -> None:
+        self.title = title
+        self.year = year
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __repr__(self) -> str:
+        return f"Movie({self.title!r}, {self.year}, {self.path!r})"
+
+    def as_dict(self) -> Dict:
+        """The classic ``{"title", "year", "file"}`` dict."""
+        return {"title": self.title, "year": self.year, "file": self.path}
+
+
+# ─────────────────────────── public API ───────────────────────────────
+def iter_movies(root: str | Path = ".", use_index: bool = True,
+                exclude: Iterable[str] = (), detect: bool = False) -> Iterator[Movie]:
+    """
+    Lazily yield a Movie for every valid movie filename in *root*. Unless
+    *detect* is set, rows are produced while the directory is read.
+    """
+    if detect:
+        infos = iter_files(root, recursive=False, use_index=use_index,
+                           exclude=exclude, detect=True)
+    else:
+        real = os.path.realpath(root)
+        infos = _iter_flat(real, LibraryIndex() if use_index else None,
+                           load_rules(real, exclude))
+    for info in infos:
+        m = MOVIE_RE.match(os.path.basename(info.path))
+        if not m:
+            continue
+        yield Movie(m.group("title").replace("_", " "), int(m.group("year")),
+                    info.path, info.size, info.mtime_ns)
+
+
+def list_movies(root: str | Path = ".", use_index: bool = True,
+                exclude: Iterable[str] = (), detect: bool = False) -> List[Dict]:
     """
     Walk *root* and return `[{"title": str, "year": int, "file": str}, …]`
     for every valid movie filename.
     """
-    root = Path(root)
-    movies = []
-    patterns = [root.glob(f"*{ext}") for ext in VIDEO_EXTS]
-    for path_iter in patterns:
-        for file in path_iter:
-            m = MOVIE_RE.match(file.name)
-            if not m:
-                continue
-            title = m.group("title").replace("_", " ")
-            movies.append(
-                {"title": title,
-                 "year": int(m.group("year")),
-                 "file": str(file.resolve())}
-            )
-    return movies
-
-
-def find_video_files(folder: Path) -> list[Path]:
-    """Return **all** video files inside *folder* recursively."""
-    return [p for p in folder.rglob("*") if p.suffix.lower() in VIDEO_EXTS]
+    return [mv.as_dict() for mv in iter_movies(root, use_index, exclude, detect)]
+
+
+def find_video_files(folder: Path, use_index: bool = True, workers: int = 1,
+                     follow_symlinks: bool = False, exclude: Iterable[str] = (),
+                     detect: bool = False, settle: float = 0.0) -> list[Path]:
+    """Return **all** video files inside *folder* recursively, each inode once."""
+    return [Path(f.path) for f in iter_files(folder, use_index=use_index, workers=workers,
+                                             follow_symlinks=follow_symlinks,
+                                             exclude=exclude, detect=detect,
+                                             settle=settle)]
+
+
+def settled(paths: Iterable[Path], settle: float) -> List[Path]:
+    """
+    The *paths* that no longer look like downloads in flight: not modified
+    in the last *settle* seconds and without a ``.part``/``.!qB`` sibling.
+    Vanished files are left out. Unlike the walk, every path is stat'ed.
+    """
+    now = time.time_ns()
+    window = int(settle * 1e9)
+    listings: Dict[Path, Set[str]] = {}
+    kept: List[Path] = []
+    for p in paths:
+        if p.parent not in listings:
+            try:
+                listings[p.parent] = {n.lower() for n in os.listdir(p.parent)}
+            except OSError:
+                listings[p.parent] = set()
+        name = p.name.lower()
+        if name.endswith(PARTIAL_SUFFIXES) or any(name + s in listings[p.parent]
+                                                  for s in PARTIAL_SUFFIXES):
+            continue
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        if st.st_mtime_ns <= now - window:
+            kept.append(p)
+    return kept
+
+
+# ─────────────────────────── fingerprints ─────────────────────────────
+def restat(files: Iterable[FileInfo]) -> Iterator[FileInfo]:
+    """
+    *files* with size, mtime and inode from a fresh ``os.stat``; vanished
+    files are dropped. The index only notices a directory change, so rows
+    it served may predate an in-place rewrite - anything that trusts
+    content must look again.
+    """
+    for f in files:
+        try:
+            st = os.stat(f.path)
+        except OSError:
+            continue
+        yield f._replace(size=st.st_size, mtime_ns=st.st_mtime_ns,
+                         dev=st.st_dev, ino=st.st_ino)
+
+
+def fingerprints(files: Iterable[FileInfo], full: bool = False,
+                 workers: int = 4) -> Dict[str, Dict[str, Optional[str]]]:
+    """
+    ``{path: {"partial", "osdb"[, "full"]}}`` for *files*, served from the
+    fingerprint store when ``(dev, inode, size, mtime_ns)`` still matches.
+    The key comes from a fresh stat (see `restat`), never from the scan.
+    Only the misses are read, on *workers* threads; ``full=True`` also
+    makes sure the whole-file digest is present. Unreadable files are
+    left out of the result.
+    """
+    store = FingerprintStore()
+    out: Dict[str, Dict[str, Optional[str]]] = {}
+    misses: List[Tuple[FileInfo, str, Dict]] = []
+    for f in restat(files):
+        key = store_key(f.dev, f.ino, f.size, f.mtime_ns)
+        rec = store.get(key)
+        if "partial" in rec and (not full or "full" in rec):
+            out[f.path] = rec
+        else:
+            misses.append((f, key, rec))
+
+    def compute(item: Tuple[FileInfo, str, Dict]) -> Optional[Dict[str, Optional[str]]]:
+        f, _key, rec = item
+        new: Dict[str, Optional[str]] = {}
+        try:
+            if "partial" not in rec:
+                new["partial"], new["osdb"] = head_tail_digests(f.path, f.size)
+            if full and "full" not in rec:
+                new["full"] = full_digest(f.path)
+        except OSError as exc:
+            log.warning("Cannot read %s: %s", f.path, exc)
+            return None
+        return new
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zelhash") as pool:
+            for (f, key, _rec), new in zip(misses, pool.map(compute, misses)):
+                if new is None:
+                    continue
+                store.update(key, **new)
+                out[f.path] = store.get(key)
+        store.save()
+    return out
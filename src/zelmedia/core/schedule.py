@@ -0,0 +1,100 @@
+"""
+Per-device move scheduler.
+
+Jobs are grouped by ``(source st_dev, destination st_dev)``. Same-device
+jobs are renames that finish instantly, so they run inline on a "fast
+lane" while the copies proceed. Every cross-device pair gets its own pool
+of *per_pair* workers, so two source disks feed one SSD concurrently. The
+limit is per pair, not per disk: a disk in N active pairs (one SSD fed by
+two source disks, say) sees up to N × *per_pair* streams.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from tqdm import tqdm
+
+from . import transfer
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+Job = Tuple[Path, Path]                 # (source file, destination directory)
+
+
+def device_pair(src: Path, dst_dir: Path) -> Optional[Tuple[int, int]]:
+    """``(src st_dev, dst_dir st_dev)``, or None if either cannot be stat'ed."""
+    try:
+        return os.stat(src).st_dev, os.stat(dst_dir).st_dev
+    except OSError:
+        return None
+
+
+def run(jobs: Sequence[Job], fn: Callable[[Path, Path], T], per_pair: int = 1,
+        desc: str = "Moving files", sizes: Optional[Sequence[int]] = None) -> List[T]:
+    """
+    Call ``fn(src, dst_dir)`` for every job and return the results in job
+    order. The first exception from *fn* propagates once the jobs already
+    running have finished; queued ones are cancelled.
+
+    With *sizes* (bytes per job) the bar counts bytes, so it shows MB/s and
+    an ETA; copies report progress as they go via `transfer.set_progress`
+    and every job is topped up to its full size when it finishes.
+    """
+    lanes: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    fast: List[int] = []
+    for i, (src, dst_dir) in enumerate(jobs):
+        pair = device_pair(src, dst_dir)
+        if pair is None or pair[0] == pair[1]:
+            fast.append(i)
+        else:
+            lanes[pair].append(i)
+    log.debug("%d same-device jobs, %d device pairs", len(fast), len(lanes))
+
+    if sizes is None:
+        bar = tqdm(total=len(jobs), desc=desc, unit="file")
+    else:
+        bar = tqdm(total=sum(sizes), desc=desc, unit="B", unit_scale=True, unit_divisor=1024)
+    lock = threading.Lock()
+    local = threading.local()
+
+    def advance(n: int) -> None:
+        local.sent = getattr(local, "sent", 0) + n
+        with lock:
+            bar.update(n)
+
+    def call(i: int) -> T:
+        local.sent = 0
+        try:
+            return fn(*jobs[i])
+        finally:
+            with lock:
+                bar.update(1 if sizes is None else max(0, sizes[i] - local.sent))
+
+    results: List[Optional[T]] = [None] * len(jobs)
+    pools = [ThreadPoolExecutor(max_workers=max(1, per_pair),
+                                thread_name_prefix=f"zelmove-{src_dev}-{dst_dev}")
+             for src_dev, dst_dev in lanes]
+    if sizes is not None:
+        transfer.set_progress(advance)
+    try:
+        futures: Dict[Future, int] = {}
+        for pool, indices in zip(pools, lanes.values()):
+            for i in indices:
+                futures[pool.submit(call, i)] = i
+        for i in fast:
+            results[i] = call(i)
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    finally:
+        for pool in pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+        transfer.set_progress(None)
+        bar.close()
+    return results  # type: ignore[return-value]
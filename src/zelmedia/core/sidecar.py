@@ -0,0 +1,61 @@
+"""
+Subtitles, .nfo files and artwork that belong to a video.
+
+A file is a sidecar of a video in the same directory when its name
+starts with the video's stem followed by "." or "-" ("Movie.en.srt",
+"Movie-poster.jpg"); with several candidates the longest stem wins.
+Folder-level artwork and metadata ("poster.jpg", "movie.nfo" …) belong to
+the video only when it is alone in its directory.
+
+When the video is renamed or flattened into a library, each sidecar is
+renamed to match: "Movie.en.srt" → "New.en.srt", "poster.jpg" →
+"New-poster.jpg", "movie.nfo" → "New.nfo".
+"""
+from __future__ import annotations
+
+import os
+from typing import Dict, Iterable, List, Sequence
+
+SIDECAR_EXTS: frozenset[str] = frozenset({
+    ".srt", ".ass", ".ssa", ".sub", ".idx", ".vtt", ".sup",
+    ".nfo", ".jpg", ".jpeg", ".png", ".tbn",
+})
+
+# per-folder names (lower-case stems) used by Kodi/Jellyfin/Plex and release groups
+FOLDER_ART: frozenset[str] = frozenset({
+    "poster", "folder", "cover", "fanart", "backdrop", "banner", "landscape",
+    "clearlogo", "logo", "thumb", "movie",
+})
+
+
+def is_sidecar_name(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in SIDECAR_EXTS
+
+
+def match(videos: Sequence[str], names: Iterable[str]) -> Dict[str, List[str]]:
+    """``{video name: [sidecar names]}`` for the files of one directory."""
+    stems = sorted(((os.path.splitext(v)[0], v) for v in videos),
+                   key=lambda sv: -len(sv[0]))
+    out: Dict[str, List[str]] = {v: [] for v in videos}
+    for name in sorted(names):
+        if not is_sidecar_name(name):
+            continue
+        owner = next((v for stem, v in stems
+                      if name.startswith(stem) and name[len(stem):len(stem) + 1] in (".", "-")),
+                     None)
+        if owner is None and len(videos) == 1 \
+                and os.path.splitext(name)[0].lower() in FOLDER_ART:
+            owner = videos[0]
+        if owner is not None:
+            out[owner].append(name)
+    return out
+
+
+def renamed(name: str, old_stem: str, new_stem: str) -> str:
+    """New name for sidecar *name* once its video's stem becomes *new_stem*."""
+    if name.startswith(old_stem) and name[len(old_stem):len(old_stem) + 1] in (".", "-"):
+        return new_stem + name[len(old_stem):]
+    stem, ext = os.path.splitext(name)
+    if ext.lower() == ".nfo":
+        return new_stem + ext
+    return f"{new_stem}-{stem}{ext}"
@@ -0,0 +1,157 @@
+"""
+Bandwidth and I/O-priority limits for copies, so a long move does not
+starve a media server streaming from the same disks.
+
+A single token bucket is shared by every copy thread. Its rate comes from
+``--max-rate`` and can be changed while a move is running by writing a
+new value ("200M", "off" …) to ~/.local/state/zel/move.rate - the file is
+re-read whenever its mtime changes (checked at most once a second), so a
+cron job can lift the limit overnight.
+
+``--low-priority`` puts each copy thread in the idle I/O class (what
+``ionice -c3`` does); it only has an effect with the BFQ/CFQ schedulers.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import platform
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .constants import RATE_FILE
+
+log = logging.getLogger(__name__)
+
+_RATE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?(?:/s)?\s*$", re.I)
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+MIN_CHUNK = 64 * 1024
+_CHECK_EVERY = 1.0
+
+
+def parse_rate(text: str) -> float:
+    """Bytes per second for "80M", "1.5G", "500k", "80MB/s" …; 0 for "off"/"0"."""
+    if text.strip().lower() in ("", "off", "none", "unlimited"):
+        return 0.0
+    m = _RATE_RE.match(text)
+    if not m:
+        raise ValueError(f"not a rate: {text!r}")
+    return float(m.group(1)) * _UNITS[m.group(2).lower()]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket holding at most one second of credit. Takers
+    may drive it into debt and then sleep it off outside the lock, so
+    concurrent copies share the rate fairly.
+    """
+
+    def __init__(self, rate: float = 0.0) -> None:
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = 0.0
+        self._stamp = time.monotonic()
+
+    def take(self, n: int) -> None:
+        with self._lock:
+            rate = self.rate
+            if rate <= 0:
+                return
+            now = time.monotonic()
+            self._tokens = min(rate, self._tokens + (now - self._stamp) * rate) - n
+            self._stamp = now
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# ─────────────────────────── module state ─────────────────────────────
+_bucket = TokenBucket()
+_control: Optional[Path] = None
+_control_mtime: Optional[int] = None
+_next_check = 0.0
+_low_priority = False
+_local = threading.local()
+
+
+def configure(max_rate: float = 0.0, low_priority: bool = False,
+              control_file: Optional[Path] = RATE_FILE) -> None:
+    """
+    Set the shared copy limit (bytes/s, 0 = unlimited) and I/O class. An
+    existing *control_file* overrides *max_rate* only if it is changed
+    after this call.
+    """
+    global _control, _control_mtime, _next_check, _low_priority
+    _bucket.rate = max_rate
+    _low_priority = low_priority
+    _control = control_file
+    _control_mtime = _mtime(control_file) if control_file else None
+    _next_check = time.monotonic() + _CHECK_EVERY
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _poll_control() -> None:
+    global _control_mtime, _next_check
+    now = time.monotonic()
+    if _control is None or now < _next_check:
+        return
+    _next_check = now + _CHECK_EVERY
+    mtime = _mtime(_control)
+    if mtime is None or mtime == _control_mtime:
+        return
+    _control_mtime = mtime
+    try:
+        rate = parse_rate(_control.read_text())
+    except (OSError, ValueError) as exc:
+        log.warning("Ignoring %s: %s", _control, exc)
+        return
+    if rate != _bucket.rate:
+        log.info("Copy rate limit now %s", f"{rate / (1 << 20):.0f} MiB/s" if rate else "off")
+        _bucket.rate = rate
+
+
+def chunk(count: int) -> int:
+    """Shrink a copy chunk to ~0.1 s worth of the current limit."""
+    rate = _bucket.rate
+    return min(count, max(MIN_CHUNK, int(rate / 10))) if rate > 0 else count
+
+
+def acquire(n: int) -> None:
+    """Block until *n* more bytes may be copied (no-op when unlimited)."""
+    _poll_control()
+    if _low_priority and not getattr(_local, "idle", False):
+        _local.idle = True
+        _set_idle_io()
+    _bucket.take(n)
+
+
+# ─────────────────────────── I/O priority ─────────────────────────────
+_IOPRIO_SYSCALL = {"x86_64": 251, "i386": 289, "i686": 289, "aarch64": 30,
+                   "riscv64": 30, "armv7l": 314, "ppc64le": 273, "s390x": 282}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+
+def _set_idle_io() -> None:
+    """``ionice -c3`` for the calling thread (Linux only)."""
+    nr = _IOPRIO_SYSCALL.get(platform.machine())
+    if nr is None:
+        log.debug("ioprio_set unknown on %s", platform.machine())
+        return
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if libc.syscall(nr, _IOPRIO_WHO_PROCESS, 0,
+                    _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) != 0:
+        log.debug("ioprio_set failed: %s", os.strerror(ctypes.get_errno()))
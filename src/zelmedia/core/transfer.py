@@ -0,0 +1,525 @@
+"""
+Low-level file moves.
+
+Same-filesystem moves are a single ``os.rename``. Cross-device moves copy
+through the kernel (``copy_file_range``, then ``sendfile``) with the
+target preallocated and the source read with a sequential-access hint,
+so throughput is close to raw disk speed; ``pread``/``pwrite`` is the
+last resort on platforms without those calls.
+
+Copies go to a hidden ``.name.<dev>-<ino>.zelpart`` file (named after the
+source inode) next to the target, with a small JSON journal of the bytes
+already made durable. If a move is interrupted, the next run resumes
+from the last checkpoint; the target only appears (atomically) when
+complete, and only then is the source deleted. `sweep_partials` removes
+part files whose source is gone or has changed, as those can never resume.
+
+With ``replace=False`` the finished file is put in place with
+`rename_noreplace`, so a name that was taken meanwhile raises
+FileExistsError instead of being overwritten; the complete part file is
+kept, and a retry under another name in the same directory reuses it.
+
+With ``verify`` the source is hashed (BLAKE2b, the same digest as
+``fingerprint.full_digest``) as it streams through the copy, so it is
+read only once. The target is then fsynced, dropped from the page cache
+and hashed from disk before it replaces anything; the digest is recorded
+in the fingerprint store under the new file's key.
+
+Every copy loop draws from the shared `throttle` token bucket, so
+``--max-rate`` / ``--low-priority`` apply to all copy threads together.
+
+``link_file`` ingests without touching the source at all: a reflink
+(``FICLONE``) where the filesystem shares extents, otherwise a hardlink
+on the same filesystem, and only then a copy.
+"""
+from __future__ import annotations
+
+import contextlib
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:                     # non-POSIX: no reflinks
+    fcntl = None  # type: ignore[assignment]
+
+from . import throttle
+from .fingerprint import FingerprintStore, full_digest, store_key
+
+log = logging.getLogger(__name__)
+
+CHUNK = 8 * 1024 * 1024
+CHECKPOINT_BYTES = 256 * 1024 * 1024
+PART_SUFFIX = ".zelpart"
+LINK_SUFFIX = ".zellink"
+FICLONE = 0x40049409                    # _IOW(0x94, 9, int) from linux/fs.h
+
+# errors that mean "this fast path is not available here, try the next one"
+_UNSUPPORTED = {errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP,
+                errno.ENOTSUP, errno.EBADF, errno.EPERM}
+# ... and for reflinks/hardlinks (wrong fs, different device, link limit)
+_NO_LINK = _UNSUPPORTED | {errno.ENOTTY, errno.EMLINK}
+
+
+# called with each copied byte count (set by `schedule.run` for its progress bar)
+_progress: Optional[Callable[[int], None]] = None
+_local = threading.local()
+
+
+def set_progress(callback: Optional[Callable[[int], None]]) -> None:
+    """Install *callback(nbytes)*, called from copy threads as data lands."""
+    global _progress
+    _progress = callback
+
+
+@contextlib.contextmanager
+def unreported() -> Iterator[None]:
+    """Keep this thread's copies out of the progress callback (e.g. sidecars)."""
+    was = getattr(_local, "quiet", False)
+    _local.quiet = True
+    try:
+        yield
+    finally:
+        _local.quiet = was
+
+
+class MoveStats:
+    """Thread-safe tally of files and bytes per method ("rename", "copy" …)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.files: Counter[str] = Counter()
+        self.bytes: Counter[str] = Counter()
+
+    def add(self, how: str, size: int) -> None:
+        with self._lock:
+            self.files[how] += 1
+            self.bytes[how] += size
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes.values())
+
+
+def same_device(src: Path, dst_dir: Path) -> bool:
+    """True if *src* and the directory *dst_dir* live on the same st_dev."""
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def _preallocate(fd: int, size: int) -> None:
+    if size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as exc:          # tmpfs/NFS/FAT may not support it
+            log.debug("posix_fallocate unavailable: %s", exc)
+
+
+def _advise(fd: int, size: int, advice_name: str) -> None:
+    advice = getattr(os, advice_name, None)
+    if advice is not None and hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, size, advice)
+        except OSError:
+            pass
+
+
+def _span_copy_file_range(fin: int, fout: int, offset: int, count: int) -> int:
+    return os.copy_file_range(fin, fout, count, offset, offset)
+
+
+def _span_sendfile(fin: int, fout: int, offset: int, count: int) -> int:
+    os.lseek(fout, offset, os.SEEK_SET)
+    return os.sendfile(fout, fin, offset, count)
+
+
+def _span_userspace(fin: int, fout: int, offset: int, count: int,
+                    h: Optional[hashlib._Hash] = None) -> int:
+    data = os.pread(fin, count, offset)
+    if h is not None:
+        h.update(data)
+    written = 0
+    while written < len(data):
+        written += os.pwrite(fout, data[written:], offset + written)
+    return len(data)
+
+
+def _span_hashing(h: hashlib._Hash) -> Callable[[int, int, int, int], int]:
+    """A userspace span copier that also feeds every byte read into *h*."""
+    def span(fin: int, fout: int, offset: int, count: int) -> int:
+        return _span_userspace(fin, fout, offset, count, h)
+    return span
+
+
+def _span_methods() -> List[Callable[[int, int, int, int], int]]:
+    methods = []
+    if hasattr(os, "copy_file_range"):
+        methods.append(_span_copy_file_range)
+    if hasattr(os, "sendfile"):
+        methods.append(_span_sendfile)
+    methods.append(_span_userspace)
+    return methods
+
+
+def _hash_prefix(fd: int, length: int, h: hashlib._Hash) -> None:
+    pos = 0
+    while pos < length:
+        data = os.pread(fd, min(CHUNK, length - pos), pos)
+        if not data:
+            break
+        h.update(data)
+        pos += len(data)
+
+
+def copy_file(src: Path, dst: Path, start: int = 0,
+              checkpoint: Optional[Callable[[int, int], None]] = None,
+              digest: Optional[hashlib._Hash] = None) -> int:
+    """
+    Copy the bytes of *src* into *dst* and carry over mode and timestamps.
+    Returns the number of bytes in *dst*.
+
+    With *start* > 0 the first *start* bytes of *dst* are trusted and the
+    copy resumes there. *checkpoint(fd, offset)* is called every
+    CHECKPOINT_BYTES with the output fd so the caller can fsync and record
+    progress. A *digest* object is fed every source byte; this forces the
+    userspace copy path since the kernel paths never surface the data.
+    A method that copies nothing before the end of *src* hands over to the
+    next one; a short result is returned as is, for the caller to refuse.
+    """
+    fin = os.open(src, os.O_RDONLY)
+    try:
+        size = os.fstat(fin).st_size
+        flags = os.O_WRONLY | os.O_CREAT | (0 if start else os.O_TRUNC)
+        fout = os.open(dst, flags, 0o644)
+        try:
+            if not start:
+                _preallocate(fout, size)
+            _advise(fin, size, "POSIX_FADV_SEQUENTIAL")
+            if digest is None:
+                methods = _span_methods()
+            else:
+                _hash_prefix(fin, start, digest)
+                methods = [_span_hashing(digest)]
+            pos = start
+            next_mark = start + CHECKPOINT_BYTES
+            while pos < size:
+                count = throttle.chunk(min(CHUNK, size - pos))
+                try:
+                    n = methods[0](fin, fout, pos, count)
+                except OSError as exc:
+                    if exc.errno in _UNSUPPORTED and len(methods) > 1:
+                        log.debug("%s unavailable (%s)", methods[0].__name__, exc)
+                        methods.pop(0)
+                        continue
+                    raise
+                if n == 0:                      # e.g. FUSE/procfs-like files
+                    if len(methods) > 1:
+                        log.debug("%s copied nothing at %d of %d - trying the next method",
+                                  methods[0].__name__, pos, size)
+                        methods.pop(0)
+                        continue
+                    break                       # the source shrank: caller checks
+                pos += n
+                throttle.acquire(n)             # pay afterwards: sleeps off any debt
+                if _progress is not None and not getattr(_local, "quiet", False):
+                    _progress(n)
+                if checkpoint is not None and pos >= next_mark:
+                    checkpoint(fout, pos)
+                    next_mark = pos + CHECKPOINT_BYTES
+            os.ftruncate(fout, pos)          # drop any preallocated slack
+            os.fsync(fout)
+            _advise(fin, size, "POSIX_FADV_DONTNEED")
+        finally:
+            os.close(fout)
+    finally:
+        os.close(fin)
+    shutil.copystat(src, dst)
+    return pos
+
+
+# ─────────────────────────── resumable moves ──────────────────────────
+def _partial_paths(src: Path, st: os.stat_result, dst_dir: Path) -> Tuple[Path, Path]:
+    # keyed on the source inode so same-named sources never share a part file
+    part = dst_dir / f".{src.name}.{st.st_dev:x}-{st.st_ino:x}{PART_SUFFIX}"
+    return part, part.with_name(part.name + ".json")
+
+
+def _identity(st: os.stat_result) -> Dict[str, int]:
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "dev": st.st_dev, "ino": st.st_ino}
+
+
+def _resume_offset(src: Path, ident: Dict[str, int], part: Path, journal: Path) -> int:
+    """Bytes of *part* that can be trusted, or 0 to start over."""
+    try:
+        state = json.loads(journal.read_text())
+        part_size = part.stat().st_size
+    except (OSError, json.JSONDecodeError):
+        return 0
+    if state.get("src") != str(src) or state.get("ident") != ident:
+        log.info("Source changed since the interrupted copy - starting over")
+        return 0
+    done = int(state.get("done", 0))
+    return done if 0 < done <= part_size else 0
+
+
+def _write_journal(journal: Path, src: Path, ident: Dict[str, int], done: int,
+                   dst: Path) -> None:
+    tmp = journal.with_name(journal.name + ".tmp")
+    tmp.write_text(json.dumps({"src": str(src), "ident": ident, "done": done,
+                               "dst": str(dst)}))
+    os.replace(tmp, journal)
+
+
+def discard_partial(src: Path, dst_dir: Path) -> None:
+    """Remove the part file (and journal) a copy of *src* left in *dst_dir*."""
+    try:
+        st = os.stat(src)
+    except OSError:
+        return                          # `sweep_partials` will see to it
+    for path in _partial_paths(src, st, dst_dir):
+        path.unlink(missing_ok=True)
+
+
+def sweep_partials(directory: Path) -> int:
+    """
+    Delete the part files in *directory* that can never resume: their
+    source is gone or has changed since, or their journal is missing or
+    unreadable. Returns how many were removed.
+    """
+    removed = 0
+    try:
+        parts = [p for p in directory.iterdir() if p.name.endswith(PART_SUFFIX)]
+    except OSError:
+        return 0
+    for part in parts:
+        journal = part.with_name(part.name + ".json")
+        try:
+            state = json.loads(journal.read_text())
+            src = Path(state["src"])
+            st = os.stat(src)
+            live = (state.get("ident") == _identity(st)
+                    and _partial_paths(src, st, directory)[0] == part)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            live = False                # no journal, a bad one, or no source
+        except OSError:                 # unreadable: leave it be
+            continue
+        if not live:
+            log.info("Removing stale partial copy %s", part.name)
+            part.unlink(missing_ok=True)
+            journal.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def _digest_from_disk(path: Path) -> str:
+    """``full_digest`` of *path* after evicting it from the page cache."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        _advise(fd, 0, "POSIX_FADV_DONTNEED")
+    finally:
+        os.close(fd)
+    return full_digest(str(path))
+
+
+def _resumable_copy(src: Path, dst: Path, verify: bool = False,
+                    replace: bool = True) -> Optional[str]:
+    """
+    Copy *src* to a hidden part file beside *dst*, journaling the completed
+    prefix every CHECKPOINT_BYTES (after an fsync), then rename it into
+    place (see `_put`). An interrupted copy resumes from its last checkpoint.
+
+    With *verify*, returns the checked digest; on a mismatch the partial
+    file is discarded and OSError(EIO) is raised with *src* untouched.
+    A copy shorter than *src* raises OSError(EIO) as well, before *dst*
+    is touched.
+    """
+    st = os.stat(src)
+    part, journal = _partial_paths(src, st, dst.parent)
+    ident = _identity(st)
+    start = _resume_offset(src, ident, part, journal)
+    if start:
+        log.info("Resuming %s at %.1f MB", src.name, start / 1e6)
+
+    def checkpoint(fd: int, offset: int) -> None:
+        os.fsync(fd)
+        _write_journal(journal, src, ident, offset, dst)
+
+    h = hashlib.blake2b(digest_size=20) if verify else None
+    _write_journal(journal, src, ident, start, dst)
+    copied = copy_file(src, part, start=start, checkpoint=checkpoint, digest=h)
+    if copied != st.st_size:
+        raise OSError(errno.EIO, f"copied {copied} of {st.st_size} bytes", str(src))
+    if h is not None and _digest_from_disk(part) != h.hexdigest():
+        part.unlink(missing_ok=True)
+        journal.unlink(missing_ok=True)
+        raise OSError(errno.EIO, "copy does not match its source", str(src))
+    if not replace:                     # a retry after EEXIST resumes at the end
+        _write_journal(journal, src, ident, copied, dst)
+    _put(part, dst, replace)
+    journal.unlink(missing_ok=True)
+    return h.hexdigest() if h is not None else None
+
+
+def _put(tmp: Path, dst: Path, replace: bool) -> None:
+    """Rename *tmp* to *dst*; without *replace*, FileExistsError if *dst* exists."""
+    if replace:
+        os.replace(tmp, dst)
+    else:
+        rename_noreplace(tmp, dst)
+
+
+def move_file(src: Path, dst: Path, verify: bool = False,
+              store: Optional[FingerprintStore] = None, replace: bool = True) -> str:
+    """
+    Move *src* to *dst* (an existing *dst* is replaced, unless *replace*
+    is False: then FileExistsError is raised). Returns "rename"
+    when it was a metadata-only move, "copy" when the bytes were copied.
+    Copies are resumable and the source is only removed once the target
+    is complete and in place.
+
+    *verify* checks copied bytes against a digest taken during the copy
+    (renames move no data and need no check); the digest is saved as the
+    target's "full" fingerprint in *store* when one is given.
+    """
+    if same_device(src, dst.parent):
+        try:
+            _put(src, dst, replace)
+            return "rename"
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:        # e.g. bind mounts of one fs
+                raise
+    _copy_and_record(src, dst, verify, store, replace)
+    os.unlink(src)
+    return "copy"
+
+
+def _copy_and_record(src: Path, dst: Path, verify: bool,
+                     store: Optional[FingerprintStore], replace: bool = True) -> None:
+    digest = _resumable_copy(src, dst, verify, replace)
+    if digest is not None and store is not None:
+        st = os.stat(dst)
+        store.update(store_key(st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns),
+                     full=digest)
+
+
+# ─────────────────────────── no-replace rename ────────────────────────
+_AT_FDCWD = -100
+_RENAME_NOREPLACE = 1
+_renameat2: Optional[Callable[..., int]] = None
+_renameat2_loaded = False
+
+
+def _load_renameat2() -> Optional[Callable[..., int]]:
+    global _renameat2, _renameat2_loaded
+    if not _renameat2_loaded:
+        _renameat2_loaded = True
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            _renameat2 = libc.renameat2         # glibc >= 2.28
+            _renameat2.argtypes = (ctypes.c_int, ctypes.c_char_p,
+                                   ctypes.c_int, ctypes.c_char_p, ctypes.c_uint)
+        except (OSError, AttributeError):
+            _renameat2 = None
+    return _renameat2
+
+
+def rename_noreplace(src: Path, dst: Path) -> None:
+    """
+    Rename *src* to *dst* on the same filesystem, raising FileExistsError
+    instead of replacing an existing *dst*. Uses ``renameat2`` with
+    RENAME_NOREPLACE; where the kernel, libc or filesystem lacks it, a
+    hardlink + unlink (also atomic), and only as a last resort an
+    exists() check before a plain rename.
+    """
+    fn = _load_renameat2()
+    if fn is not None:
+        if fn(_AT_FDCWD, os.fsencode(src), _AT_FDCWD, os.fsencode(dst), _RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        if err not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+            raise OSError(err, os.strerror(err), str(src), None, str(dst))
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        raise
+    except OSError as exc:
+        if exc.errno not in _NO_LINK:
+            raise
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(dst))
+        os.rename(src, dst)
+        return
+    os.unlink(src)
+
+
+# ─────────────────────────── seeding-safe ingest ──────────────────────
+def _reflink(src: Path, dst: Path, replace: bool = True) -> None:
+    """Share *src*'s extents with a new *dst* (Btrfs, XFS, bcachefs …)."""
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "reflinks need fcntl.ioctl")
+    tmp = dst.with_name(f".{dst.name}{LINK_SUFFIX}")
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        shutil.copystat(src, tmp)
+        _put(tmp, dst, replace)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _hardlink(src: Path, dst: Path, replace: bool = True) -> None:
+    tmp = dst.with_name(f".{dst.name}{LINK_SUFFIX}")
+    tmp.unlink(missing_ok=True)
+    os.link(src, tmp)
+    try:
+        _put(tmp, dst, replace)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+LINK_MODES = {
+    "auto": ("reflink", "hardlink", "copy"),
+    "reflink": ("reflink",),
+    "hardlink": ("hardlink",),
+    "copy": ("copy",),
+}
+
+
+def link_file(src: Path, dst: Path, mode: str = "auto", verify: bool = False,
+              store: Optional[FingerprintStore] = None, replace: bool = True) -> str:
+    """
+    Put *src*'s content at *dst* while leaving *src* untouched (so torrents
+    keep seeding). "auto" tries a reflink, then a hardlink, then a copy;
+    the other modes try only that method. Returns the method used.
+    *verify*/*store* apply to copies and *replace* to all methods, as in
+    `move_file`.
+    """
+    methods = LINK_MODES[mode]
+    for how in methods:
+        if how == "copy":
+            _copy_and_record(src, dst, verify, store, replace)
+            return how
+        try:
+            (_reflink if how == "reflink" else _hardlink)(src, dst, replace)
+            return how
+        except OSError as exc:
+            if exc.errno not in _NO_LINK or how == methods[-1]:
+                raise
+            log.debug("%s not possible for %s (%s)", how, src.name, exc)
+    raise AssertionError(mode)
@@ -0,0 +1,191 @@
+"""
+Watch a Downloads folder and yield batches of newly finished videos.
+
+On Linux this talks to inotify directly through ctypes and reacts to
+IN_CLOSE_WRITE / IN_MOVED_TO. Anywhere else (or if inotify is not
+available) it falls back to polling, with fresh stats each time.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from . import scan
+from .ignore import IgnoreRules, load_rules, relative
+
+log = logging.getLogger(__name__)
+
+# ───────────────────────── inotify constants ─────────────────────────
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ONLYDIR     = 0x01000000
+IN_ISDIR       = 0x40000000
+IN_CLOEXEC     = 0o2000000
+IN_NONBLOCK    = 0o4000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+_EVENT_HDR = struct.Struct("iIII")          # wd, mask, cookie, len
+
+
+class _Inotify:
+    """Minimal recursive inotify wrapper (one watch per directory)."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+
+    def add_tree(self, root: str, skip: Optional[Callable[[str], bool]] = None) -> None:
+        """Watch *root* and every directory below it, minus those *skip* rejects."""
+        for dirpath, dirs, _files in os.walk(root):
+            if skip is not None:
+                dirs[:] = [d for d in dirs if not skip(os.path.join(dirpath, d))]
+            wd = self._add(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                log.warning("Cannot watch %s: %s", dirpath,
+                            os.strerror(ctypes.get_errno()))
+                continue
+            self._dirs[wd] = dirpath
+
+    def read(self, timeout: float | None) -> List[tuple[str, int]]:
+        """Return ``[(path, mask), …]`` for events arriving within *timeout*."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(buf):
+            wd, mask, _cookie, length = _EVENT_HDR.unpack_from(buf, offset)
+            offset += _EVENT_HDR.size
+            name = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            base = self._dirs.get(wd)
+            if mask & IN_Q_OVERFLOW or base is None:
+                events.append(("", mask))
+                continue
+            events.append((os.path.join(base, os.fsdecode(name)), mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+# ───────────────────────── batch generators ──────────────────────────
+def _ready(pending: Set[str], settle: float) -> List[Path]:
+    """
+    Take the *pending* paths that have settled (see `scan.settled`) out of
+    the set and return them; files that vanished are dropped, the rest wait.
+    """
+    alive = [Path(p) for p in sorted(pending) if os.path.isfile(p)]
+    ready = scan.settled(alive, settle) if settle else alive
+    pending.clear()
+    pending.update(map(str, set(alive) - set(ready)))
+    return ready
+
+
+def _inotify_batches(ino: _Inotify, root: str, debounce: float,
+                     settle: float, rules: IgnoreRules) -> Iterator[List[Path]]:
+    def ignored(path: str, is_dir: bool = False) -> bool:
+        return bool(rules) and rules.hides(relative(root, path), is_dir)
+
+    def skip_dir(path: str) -> bool:
+        return ignored(path, is_dir=True)
+
+    try:
+        ino.add_tree(root, skip_dir)
+        pending: Set[str] = set()
+        while True:
+            # block until something happens, then keep draining until quiet
+            events = ino.read(None if not pending else debounce)
+            if not events:
+                if pending:
+                    batch = _ready(pending, settle)
+                    if batch:
+                        yield batch
+                continue
+            for path, mask in events:
+                if not path:                               # queue overflow
+                    log.warning("inotify queue overflow - rescanning %s", root)
+                    pending.update(f.path for f in scan.iter_files(root, use_index=False,
+                                                                   settle=max(settle, debounce),
+                                                                   rules=rules))
+                elif mask & IN_ISDIR:
+                    if skip_dir(path):
+                        continue
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        ino.add_tree(path, skip_dir)
+                    if mask & IN_MOVED_TO:
+                        # a finished folder moved in at once; files in a
+                        # freshly created one report their own IN_CLOSE_WRITE
+                        pending.update(f.path for f in scan.iter_files(path, use_index=False,
+                                                                       rules=rules))
+                elif (mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and scan.is_video_name(path)
+                      and not ignored(path)):
+                    pending.add(path)
+    finally:
+        ino.close()
+
+
+def _poll_batches(root: str, interval: float, settle: float,
+                  rules: IgnoreRules) -> Iterator[List[Path]]:
+    """Yield settled files that showed the same size/mtime on two consecutive polls."""
+    def snapshot() -> Dict[str, tuple[int, int]]:
+        # fresh stats: the index keeps a growing file's first size until
+        # its directory changes
+        return {f.path: (f.size, f.mtime_ns)
+                for f in scan.iter_files(root, use_index=False, rules=rules)}
+
+    prev = snapshot()
+    done = set(prev)
+    while True:
+        time.sleep(interval)
+        now = snapshot()
+        stable = [Path(p) for p, sig in now.items() if p not in done and prev.get(p) == sig]
+        batch = scan.settled(stable, settle) if settle else stable
+        done = (done & now.keys()) | set(map(str, batch))
+        prev = now
+        if batch:
+            yield sorted(batch)
+
+
+def watch_batches(root: str | Path, debounce: float = 5.0, settle: float = 0.0,
+                  exclude: Iterable[str] = ()) -> Iterator[List[Path]]:
+    """
+    Yield lists of video files that finished arriving under *root*.
+    Bursts of events are grouped until *debounce* seconds pass quietly.
+    With *settle*, a file is held back while it was modified in the last
+    *settle* seconds or has a ``.part``/``.!qB`` sibling - torrent clients
+    close and reopen files many times before they are complete.
+    ``root/.zelignore`` and *exclude* patterns (read once) apply to every
+    event and rescan, as they do for a scan of *root*.
+    """
+    root = os.path.realpath(root)
+    rules = load_rules(root, exclude)
+    try:
+        ino = _Inotify()
+    except (OSError, AttributeError) as exc:         # no inotify on this platform
+        log.info("inotify unavailable (%s) - polling every %.0fs", exc, debounce)
+        yield from _poll_batches(root, debounce, settle, rules)
+        return
+    yield from _inotify_batches(ino, root, debounce, settle, rules)